@@ -0,0 +1,65 @@
+import json
+
+# 流式输出辅助：SSE 事件编码，以及从流式文本中增量解析 JSON 数组元素
+
+def sse_event(data, event: str = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+class JsonArrayParser:
+    """
+    逐段喂入模型输出，每当数组中一个顶层对象闭合就立即解析返回。
+    数组之前的内容（如 ```json 代码块标记）会被跳过。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None
+        self.done = False
+
+    def feed(self, chunk: str):
+        items = []
+        if self.done:
+            return items
+        self._buffer += chunk
+        while self._pos < len(self._buffer):
+            ch = self._buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self._depth > 0
+            elif ch in "[{":
+                if self._depth == 1 and ch == "{":
+                    self._start = self._pos
+                if self._depth > 0 or ch == "[":
+                    self._depth += 1
+            elif ch in "]}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 1 and ch == "}" and self._start is not None:
+                    items.append(json.loads(self._buffer[self._start:self._pos + 1]))
+                    self._start = None
+                elif self._depth == 0:
+                    self.done = True
+                    break
+            self._pos += 1
+        # 丢弃已消费且不再需要的前缀
+        keep_from = self._start if self._start is not None else self._pos
+        self._buffer = self._buffer[keep_from:]
+        self._pos -= keep_from
+        if self._start is not None:
+            self._start = 0
+        return items
@@ -0,0 +1,150 @@
+import math
+import re
+from collections import defaultdict
+from sqlalchemy.orm import Session, load_only
+from models import Task, Attachment, AttachmentText
+import crud
+import fulltext
+
+# 数据分析的上下文构建：统计汇总 + 与问题最相关的任务（紧凑表格）+ 附件片段，
+# 按估算的token数装进预算，装不下的条目跳过。
+
+RRF_K = 60  # 倒数排名融合常数
+SEMANTIC_MIN_SCORE = 0.15  # 低于该相似度的语义命中多为哈希碰撞，不纳入
+DESCRIPTION_CHARS = 80
+SNIPPET_CHARS = 160
+SNIPPET_SHARE = 0.25  # 有附件片段时为其预留的预算比例
+TOP_TAGS = 15
+
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿　-〿＀-￯]")
+_SPACE_RE = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算token数：中文（含全角标点）约0.6个/字，其余字符约0.3个/字（DeepSeek官方给出的换算比例）。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+def _cell(value, limit: int = None) -> str:
+    text = _SPACE_RE.sub(" ", str(value or "")).replace("|", "/").strip()
+    if limit and len(text) > limit:
+        text = text[:limit - 1] + "…"
+    return text
+
+def _day(value) -> str:
+    return value.strftime("%Y-%m-%d") if value else ""
+
+def _counts(counts: dict) -> str:
+    return " ".join(f"{name or '-'}:{n}" for name, n in counts.items())
+
+def aggregate_lines(stats: dict):
+    lines = [
+        "#统计汇总",
+        f"任务总数 {stats['total']}",
+        f"按状态 {_counts(stats['by_status'])}",
+        f"按类型 {_counts(stats['by_type'])}",
+        f"按优先级 {_counts(stats['by_priority'])}",
+    ]
+    if stats["by_tag"]:
+        lines.append(f"标签前{TOP_TAGS} {_counts(dict(list(stats['by_tag'].items())[:TOP_TAGS]))}")
+    if stats["completed_per_week"]:
+        lines.append(f"每周完成数 {_counts(stats['completed_per_week'])}")
+    return lines
+
+def rank_tasks(db: Session, prompt: str, semantic_hits: list, limit: int):
+    """
+    融合BM25与语义检索的排名（RRF）；两者都没有结果时退回最近更新的任务。
+    """
+    scores = defaultdict(float)
+    semantic_hits = [hit for hit in semantic_hits[:limit] if hit[1] >= SEMANTIC_MIN_SCORE]
+    for hits in (fulltext.search(db, prompt, limit=limit), semantic_hits):
+        for rank, (task_id, _) in enumerate(hits):
+            scores[task_id] += 1 / (RRF_K + rank + 1)
+    if scores:
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [task_id for task_id, in db.query(Task.id).order_by(Task.updated_at.desc(), Task.id.desc()).limit(limit)]
+
+def _snippet(text: str, terms) -> str:
+    # 以第一个命中的查询词为中心截取一段；都不命中说明附件与问题无关
+    lowered = text.lower()
+    positions = [p for p in (lowered.find(term) for term in terms) if p >= 0]
+    if not positions:
+        return None
+    start = max(0, min(positions) - SNIPPET_CHARS // 3)
+    return _cell(text[start:start + SNIPPET_CHARS])
+
+def attachment_snippets(db: Session, task_ids, prompt: str):
+    terms = sorted(set(fulltext.tokenize(prompt, for_query=True)), key=len, reverse=True)
+    if not terms or not task_ids:
+        return {}
+    snippets = defaultdict(list)
+    rows = (
+        db.query(AttachmentText.task_id, Attachment.filename, AttachmentText.text)
+        .join(Attachment, Attachment.id == AttachmentText.attachment_id)
+        .filter(AttachmentText.task_id.in_(task_ids), AttachmentText.text.isnot(None))
+    )
+    for task_id, filename, text in rows:
+        snippet = _snippet(text, terms)
+        if snippet:
+            snippets[task_id].append(f"{task_id}|{_cell(filename, 40)}|{snippet}")
+    return snippets
+
+class _Packer:
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.used = 0
+        self.lines = []
+
+    def add(self, line: str) -> bool:
+        cost = estimate_tokens(line) + 1  # 换行
+        if self.used + cost > self.budget:
+            return False
+        self.lines.append(line)
+        self.used += cost
+        return True
+
+def build(db: Session, prompt: str, semantic_hits: list, budget: int, retrieve_limit: int = 50):
+    """
+    返回 (上下文文本, 说明)，说明中含上下文token估算、纳入的任务数和附件片段数。
+    """
+    packer = _Packer(budget)
+    for line in aggregate_lines(crud.get_task_stats(db)):
+        packer.add(line)
+    task_ids = rank_tasks(db, prompt, semantic_hits, retrieve_limit)
+    tasks = {
+        t.id: t for t in db.query(Task).options(load_only(
+            Task.id, Task.title, Task.description, Task.type, Task.status, Task.priority,
+            Task.tags, Task.created_at, Task.completed_at,
+        )).filter(Task.id.in_(task_ids))
+    } if task_ids else {}
+    snippets = attachment_snippets(db, list(tasks), prompt)
+    included, snippet_count = 0, 0
+    if snippets:
+        packer.budget = budget - int((budget - packer.used) * SNIPPET_SHARE)
+    if tasks and packer.add("#相关任务 id|标题|类型|状态|优先级|标签|创建|完成|描述"):
+        for task_id in task_ids:
+            task = tasks.get(task_id)
+            if task is None:
+                continue
+            row = "|".join([
+                str(task.id), _cell(task.title, 60), _cell(task.type), _cell(task.status), _cell(task.priority),
+                _cell(task.tags, 40), _day(task.created_at), _day(task.completed_at),
+                _cell(task.description, DESCRIPTION_CHARS),
+            ])
+            if packer.add(row):
+                included += 1
+        packer.budget = budget
+        if snippets and packer.add("#附件片段 任务id|文件|片段"):
+            for task_id in task_ids:
+                for line in snippets.get(task_id, [])[:2]:
+                    if packer.add(line):
+                        snippet_count += 1
+    return "\n".join(packer.lines), {
+        "budget": budget,
+        "context_tokens": packer.used,
+        "tasks": included,
+        "snippets": snippet_count,
+    }
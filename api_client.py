@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 前端访问后端的客户端：共享长连接Session + 按接口和参数缓存GET响应
+# 自身发起的写操作（POST/PUT/DELETE）会清空缓存；缓存过期后如有ETag则发条件请求，304直接复用旧响应
+
+class ApiClient:
+    def __init__(self, base_url: str, ttl: float = 30, max_entries: int = 256, pool_size: int = 10):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    @staticmethod
+    def _key(path: str, params) -> tuple:
+        # 参数顺序不同、列表参数（如多个status）都映射到同一个键
+        items = []
+        for name, value in (params or {}).items():
+            if isinstance(value, (list, tuple)):
+                items.extend((name, str(v)) for v in value)
+            elif value is not None:
+                items.append((name, str(value)))
+        return path, tuple(sorted(items))
+
+    def get(self, path: str, params: dict = None, ttl: float = None) -> requests.Response:
+        key = self._key(path, params)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        now = time.time()
+        if cached is not None and cached[0] > now:
+            self.stats["hits"] += 1
+            return cached[1]
+        headers = {}
+        if cached is not None and cached[1].headers.get("ETag"):
+            headers["If-None-Match"] = cached[1].headers["ETag"]
+        resp = self.session.get(self.url(path), params=params, headers=headers)
+        if resp.status_code == 304 and cached is not None:
+            self.stats["revalidated"] += 1
+            resp = cached[1]
+        else:
+            self.stats["misses"] += 1
+        if resp.status_code == 200:
+            self._store(key, resp, now + (self.ttl if ttl is None else ttl))
+        return resp
+
+    def _store(self, key, resp, expires_at):
+        with self._lock:
+            self._cache[key] = (expires_at, resp)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _write(self, method: str, path: str, **kwargs) -> requests.Response:
+        try:
+            return self.session.request(method, self.url(path), **kwargs)
+        finally:
+            # 写操作可能影响列表、详情、统计等任意缓存，一律清空
+            self.invalidate()
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self._write("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self._write("PUT", path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self._write("DELETE", path, **kwargs)
+
+    def stream_post(self, path: str, **kwargs) -> requests.Response:
+        # 流式接口（如AI拆分任务）可能在推送过程中写库，调用方读完流后应再调用一次 invalidate()
+        self.invalidate()
+        return self.session.post(self.url(path), stream=True, **kwargs)
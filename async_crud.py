@@ -0,0 +1,101 @@
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from schemas import TaskCreate, TaskUpdate
+import crud
+import analysis_context
+import database
+
+# crud.py 的异步版本：在 AsyncSession.run_sync 中复用同一套查询逻辑，
+# 底层走异步驱动，等待数据库期间不占用线程。返回的对象均已加载好序列化所需的属性。
+# run_sync 里的代码在事件循环线程上执行，打分等耗CPU的逻辑，以及要分词建索引、删文件的写操作，
+# 改用同步会话放到线程池，不阻塞其他请求。
+
+def _read_in_threadpool(fn):
+    def run():
+        with database.ReadSessionLocal() as db:
+            return fn(db)
+    return run_in_threadpool(run)
+
+def _write_in_threadpool(fn):
+    def run():
+        with database.SessionLocal() as db:
+            return fn(db)
+    return run_in_threadpool(run)
+
+def _load_attachments(task):
+    if task is not None:
+        task.attachments
+    return task
+
+# 任务相关
+
+async def create_task(task: TaskCreate):
+    return await _write_in_threadpool(lambda s: _load_attachments(crud.create_task(s, task)))
+
+async def create_tasks_bulk(tasks: list):
+    return await _write_in_threadpool(lambda s: crud.create_tasks_bulk(s, tasks))
+
+async def get_task(db: AsyncSession, task_id: int):
+    return await db.run_sync(lambda s: crud.get_task(s, task_id))
+
+async def get_tasks(db: AsyncSession, skip: int = 0, limit: int = 100, view: str = "full", tag: str = None):
+    return await db.run_sync(lambda s: crud.get_tasks(s, skip=skip, limit=limit, view=view, tag=tag))
+
+async def get_tasks_page(db: AsyncSession, sort: str = "created_at", order: str = "desc", cursor: str = None,
+                         limit: int = 100, view: str = "full", tag: str = None):
+    return await db.run_sync(
+        lambda s: crud.get_tasks_page(s, sort=sort, order=order, cursor=cursor, limit=limit, view=view, tag=tag)
+    )
+
+async def search_tasks(db: AsyncSession, **filters):
+    return await db.run_sync(lambda s: crud.search_tasks(s, **filters))
+
+async def fulltext_search(query: str, limit: int = 20):
+    return await _read_in_threadpool(lambda s: crud.fulltext_search(s, query, limit=limit))
+
+async def get_scored_tasks(db: AsyncSession, hits: list):
+    return await db.run_sync(lambda s: crud.get_scored_tasks(s, hits))
+
+async def build_analysis_context(prompt: str, semantic_hits: list, budget: int, retrieve_limit: int = 50):
+    return await _read_in_threadpool(
+        lambda s: analysis_context.build(s, prompt, semantic_hits, budget, retrieve_limit=retrieve_limit)
+    )
+
+async def get_task_stats(days: int = 30, weeks: int = 12):
+    return await _read_in_threadpool(lambda s: crud.get_task_stats(s, days=days, weeks=weeks))
+
+async def update_task(task_id: int, task: TaskUpdate):
+    return await _write_in_threadpool(lambda s: _load_attachments(crud.update_task(s, task_id, task)))
+
+async def delete_task(task_id: int):
+    return await _write_in_threadpool(lambda s: crud.delete_task(s, task_id))
+
+async def get_tag_facets(db: AsyncSession, limit: int = 100):
+    return await db.run_sync(lambda s: crud.get_tag_facets(s, limit=limit))
+
+# 附件相关
+
+async def create_attachment(db: AsyncSession, **fields):
+    return await db.run_sync(lambda s: crud.create_attachment(s, **fields))
+
+async def create_attachments_bulk(db: AsyncSession, task_id: int, files: list):
+    return await db.run_sync(lambda s: crud.create_attachments_bulk(s, task_id, files))
+
+async def get_attachment(db: AsyncSession, attachment_id: int):
+    return await db.run_sync(lambda s: crud.get_attachment(s, attachment_id))
+
+def _delete_attachment(db, attachment_id: int):
+    attachment = crud.get_attachment(db, attachment_id)
+    if attachment is not None:
+        crud.delete_attachment(db, attachment)
+    return attachment
+
+async def delete_attachment(attachment_id: int):
+    # 附件不存在时返回 None
+    return await _write_in_threadpool(lambda s: _delete_attachment(s, attachment_id))
+
+async def get_changes(db: AsyncSession, since: int = 0, limit: int = 500):
+    return await db.run_sync(lambda s: crud.get_changes(s, since=since, limit=limit))
+
+async def get_attachments_by_task(db: AsyncSession, task_id: int):
+    return await db.run_sync(lambda s: crud.get_attachments_by_task(s, task_id))
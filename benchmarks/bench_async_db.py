@@ -0,0 +1,81 @@
+"""
+同步数据层（线程池 + SessionLocal）与异步数据层（AsyncSession + aiosqlite）的吞吐和延迟对比。
+
+    python -m benchmarks.bench_async_db [--tasks 2000] [--requests 2000] [--concurrency 1 10 50 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import percentile
+
+def report(mode, concurrency, elapsed, latencies):
+    print(f"{mode:>6} {concurrency:>6} {len(latencies) / elapsed:>10.1f} "
+          f"{statistics.median(latencies) * 1000:>9.2f} {percentile(latencies, 0.95) * 1000:>9.2f}")
+
+def run_sync(database, crud, n_requests, concurrency, task_ids, threads):
+    def one():
+        start = time.perf_counter()
+        db = database.SessionLocal()
+        try:
+            crud.get_tasks(db, limit=50)
+            crud.get_task(db, random.choice(task_ids))
+        finally:
+            db.close()
+        return time.perf_counter() - start
+    # 与 Starlette 线程池一样，实际并发受线程数限制
+    with ThreadPoolExecutor(max_workers=min(concurrency, threads)) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: one(), range(n_requests)))
+        return time.perf_counter() - start, latencies
+
+async def run_async(database, async_crud, n_requests, concurrency, task_ids):
+    semaphore = asyncio.Semaphore(concurrency)
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            async with database.AsyncSessionLocal() as db:
+                await async_crud.get_tasks(db, limit=50)
+                await async_crud.get_task(db, random.choice(task_ids))
+            return time.perf_counter() - start
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(n_requests)))
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--threads", type=int, default=40, help="同步模式线程池大小（Starlette 默认 40）")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        # database 模块在导入时按配置建引擎，需先指定库地址
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        import database
+        import crud
+        import async_crud
+        from models import Base
+        from schemas import TaskCreate
+        Base.metadata.create_all(database.engine)
+        db = database.SessionLocal()
+        task_ids = crud.create_tasks_bulk(db, [TaskCreate(title=f"任务 {i}", description="基准数据") for i in range(args.tasks)])
+        db.close()
+        print(f"{'mode':>6} {'conc':>6} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+        asyncio.run(compare(database, crud, async_crud, args, task_ids))
+
+async def compare(database, crud, async_crud, args, task_ids):
+    # 异步连接池绑定在创建它的事件循环上，所有轮次共用同一个循环
+    for concurrency in args.concurrency:
+        elapsed, latencies = run_sync(database, crud, args.requests, concurrency, task_ids, args.threads)
+        report("sync", concurrency, elapsed, latencies)
+        elapsed, latencies = await run_async(database, async_crud, args.requests, concurrency, task_ids)
+        report("async", concurrency, elapsed, latencies)
+    await database.async_engine.dispose()
+
+if __name__ == "__main__":
+    main()
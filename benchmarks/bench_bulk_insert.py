@@ -0,0 +1,55 @@
+"""
+批量建任务与逐条建任务的单条耗时对比（SQLite 临时库）。
+
+    python -m benchmarks.bench_bulk_insert [--sizes 1 100 10000] [--db sqlite:///bench.db]
+"""
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base
+from schemas import TaskCreate
+import crud
+
+def make_tasks(n: int):
+    return [
+        TaskCreate(title=f"批量任务 {i}", description=f"整理第{i}份周报数据 report {i}", tags="bench,报表")
+        for i in range(n)
+    ]
+
+def run(url: str, sizes):
+    engine = create_engine(url)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    print(f"{'rows':>8} {'loop ms/task':>14} {'bulk ms/task':>14} {'speedup':>8}")
+    for n in sizes:
+        results = {}
+        for mode in ("loop", "bulk"):
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+            tasks = make_tasks(n)
+            db = Session()
+            start = time.perf_counter()
+            if mode == "loop":
+                for task in tasks:
+                    crud.create_task(db, task)
+            else:
+                crud.create_tasks_bulk(db, tasks)
+            results[mode] = (time.perf_counter() - start) * 1000 / n
+            db.close()
+        print(f"{n:>8} {results['loop']:>14.3f} {results['bulk']:>14.3f} {results['loop'] / results['bulk']:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--db", help="数据库URL，默认在临时目录建SQLite文件库")
+    args = parser.parse_args()
+    if args.db:
+        run(args.db, args.sizes)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        run(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.sizes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+语义检索基准：暴力检索与IVF分区检索的延迟，以及IVF相对暴力检索的 recall@k。
+语料为按主题采样词语合成的任务文本，不依赖数据库。
+
+    python -m benchmarks.bench_semantic [--sizes 10000 100000] [--queries 200] [--nprobe 4 8 16 32]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # semantic 导入 database，基准本身不访问数据库
+
+from benchmarks.common import percentile
+from embeddings import HashingEmbedder
+from semantic import VectorIndex, task_text
+
+def make_vocabulary(rng, n_topics, words_per_topic):
+    def word():
+        return "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(2))
+    return [[word() for _ in range(words_per_topic)] for _ in range(n_topics)], [word() for _ in range(500)]
+
+def make_text(rng, topics, common):
+    topic = rng.choice(topics)
+    title = " ".join(rng.sample(topic, 3))
+    description = " ".join(rng.sample(topic, 12) + rng.sample(common, 5))
+    return task_text(title, description, "")
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def bench(size, args, embedder, topics, common):
+    rng = random.Random(size)
+    texts = [make_text(rng, topics, common) for _ in range(size)]
+    queries = embedder.embed([" ".join(rng.sample(rng.choice(topics), 4)) for _ in range(args.queries)])
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, embedder, ivf_threshold=float("inf"))
+        embed_seconds, vectors = timed(lambda: embedder.embed(texts))
+        upsert_seconds, _ = timed(lambda: index.upsert(range(1, size + 1), vectors))
+        index.commit(size)
+        print(f"\n== {size} 条任务：向量化 {size / embed_seconds:.0f} 条/秒，写入索引 {upsert_seconds:.2f}s")
+
+        latencies, truth = [], []
+        for q in queries:
+            seconds, result = timed(lambda: index.search(q[None, :], args.k)[0])
+            latencies.append(seconds)
+            truth.append({task_id for task_id, _ in result})
+        batch_seconds, _ = timed(lambda: index.search(queries, args.k))
+        print(f"暴力检索    p50 {statistics.median(latencies) * 1000:7.2f}ms  p95 {percentile(latencies, 0.95) * 1000:7.2f}ms"
+              f"  批量{len(queries)}条 {batch_seconds / len(queries) * 1000:.2f}ms/条")
+
+        index.ivf_threshold = 0
+        build_seconds, _ = timed(index._build_ivf)
+        print(f"IVF 分区数 {len(index._ivf['lists'])}，构建 {build_seconds:.2f}s")
+        for nprobe in args.nprobe:
+            latencies, recall = [], []
+            for q, expected in zip(queries, truth):
+                seconds, result = timed(lambda: index.search(q[None, :], args.k, nprobe=nprobe)[0])
+                latencies.append(seconds)
+                recall.append(len(expected & {task_id for task_id, _ in result}) / max(1, len(expected)))
+            print(f"IVF nprobe={nprobe:<3} p50 {statistics.median(latencies) * 1000:7.2f}ms  p95 {percentile(latencies, 0.95) * 1000:7.2f}ms"
+                  f"  recall@{args.k} {statistics.mean(recall):.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=300)
+    args = parser.parse_args()
+    embedder = HashingEmbedder(args.dim)
+    topics, common = make_vocabulary(random.Random(0), args.topics, 40)
+    for size in args.sizes:
+        bench(size, args, embedder, topics, common)
+
+if __name__ == "__main__":
+    main()
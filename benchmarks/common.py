@@ -0,0 +1,8 @@
+"""
+基准和压测脚本共用的小工具。
+"""
+
+def percentile(samples, q):
+    # 最近秩法：q 取 0~1，样本不需要预先排序
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
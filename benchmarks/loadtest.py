@@ -0,0 +1,317 @@
+"""
+接口压测：在 SQLite 上启动 main.py 的应用（uvicorn 子进程），大模型换成本地模拟接口（benchmarks/stub_llm.py），
+预置 N 个任务和若干附件后按比例混合发起请求，输出每个接口的吞吐和 p50/p95/p99 延迟（JSON），便于跨提交对比。
+
+    python -m benchmarks.loadtest [--scenario 1k|100k|1m] [--concurrency 32] [--duration 30] [--output result.json]
+    python -m benchmarks.loadtest --scenario 100k --data-dir /data/bench --mix list=40,get=40,search=20
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --tasks 1000   # 压已启动的服务，不建库
+
+--data-dir 下已有同规模的库时直接复用，百万任务的建库只需做一次。
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # 建库用自己的引擎，导入 database 时不访问真实库
+
+import httpx
+from benchmarks import stub_llm
+from benchmarks.common import percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "1k": {"tasks": 1000, "attachments": 50},
+    "100k": {"tasks": 100000, "attachments": 200},
+    "1m": {"tasks": 1000000, "attachments": 500},
+}
+DEFAULT_MIX = "list=25,get=25,search=15,create=8,update=8,upload=4,download=8,ai_analysis=4,ai_generate=3"
+OPERATIONS = ("list", "get", "search", "create", "update", "upload", "download", "ai_analysis", "ai_generate")
+SEED_BATCH = 5000
+
+WORDS = [
+    "报表", "周报", "客户", "合同", "发布", "测试", "预算", "采购", "招聘", "培训", "部署", "数据库",
+    "接口", "文档", "会议", "审批", "巡检", "备份", "监控", "迁移", "report", "release", "invoice", "deploy",
+]
+TAGS = ["报表", "运维", "销售", "研发", "财务", "行政"]
+STATUSES = ["pending", "in_progress", "completed"]
+
+def make_task(rng, i: int):
+    from schemas import TaskCreate
+    words = rng.sample(WORDS, 4)
+    return TaskCreate(
+        title=f"{words[0]}{words[1]} {i}",
+        description=f"整理{words[2]}相关材料并跟进{words[3]}，编号 {i}",
+        tags=",".join(rng.sample(TAGS, 2)),
+        status=rng.choice(STATUSES),
+        priority=rng.choice(["low", "normal", "high"]),
+    )
+
+def seed(url: str, n_tasks: int):
+    """
+    直接经 crud 批量写入（与 /tasks/bulk 同一路径，含全文索引和变更日志）；库中已有足够任务时跳过。
+    """
+    from sqlalchemy import create_engine, func
+    from sqlalchemy.orm import sessionmaker
+    from models import Base, Task
+    import crud
+    import migrations
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    rng = random.Random(0)
+    with Session() as db:
+        existing = db.query(func.count(Task.id)).scalar()
+        start = time.perf_counter()
+        for offset in range(existing, n_tasks, SEED_BATCH):
+            batch = [make_task(rng, i) for i in range(offset, min(offset + SEED_BATCH, n_tasks))]
+            crud.create_tasks_bulk(db, batch)
+            db.expunge_all()
+            print(f"seed {offset + len(batch)}/{n_tasks} {time.perf_counter() - start:.0f}s", file=sys.stderr, flush=True)
+    engine.dispose()
+
+def start_server(data_dir: str, db_url: str, llm_url: str, port: int, workers: int):
+    env = dict(
+        os.environ,
+        DATABASE_URL=db_url,
+        DEEPSEEK_API_URL=llm_url,
+        DEEPSEEK_API_KEY="stub",
+        LLM_CACHE_ENABLED="0",  # 每次AI调用都到达模拟接口，测的是真实路径
+        UPLOAD_DIR=os.path.join(data_dir, "uploads"),
+        SEMANTIC_INDEX_DIR=os.path.join(data_dir, "semantic_index"),
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning",
+         # 长于客户端两次请求的间隔，避免复用服务端刚关闭的长连接而计为错误
+         "--timeout-keep-alive", "75"],
+        cwd=REPO_DIR, env=env,
+    )
+
+async def wait_ready(client: httpx.AsyncClient, process=None, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"服务进程已退出，返回码 {process.returncode}")
+        try:
+            if (await client.get("/tags", params={"limit": 1})).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("等待服务启动超时")
+
+def attachment_file(rng, i: int):
+    rows = "\n".join(f"{rng.choice(WORDS)},{rng.randint(1, 1000)}" for _ in range(200))
+    return f"bench_{i}.csv", f"项目,数量\n{rows}\n".encode(), "text/csv"
+
+async def seed_attachments(client: httpx.AsyncClient, rng, n_tasks: int, n_attachments: int):
+    # 附件经上传接口写入，存储、去重与抽取走真实路径
+    ids = []
+    for i in range(n_attachments):
+        resp = await client.post(f"/tasks/{rng.randint(1, n_tasks)}/attachments/", files={"file": attachment_file(rng, i)})
+        resp.raise_for_status()
+        ids.append(resp.json()["id"])
+    return ids
+
+class Workload:
+    """
+    每种操作是一个发起请求的协程；state 保存可用的任务id上限和附件id，供后续请求随机选取。
+    """
+
+    def __init__(self, rng, n_tasks: int, attachment_ids):
+        self.rng = rng
+        self.max_task_id = n_tasks
+        self.attachment_ids = list(attachment_ids)
+
+    def task_id(self):
+        return self.rng.randint(1, self.max_task_id)
+
+    async def list(self, client):
+        return await client.get("/tasks/", params={"limit": 50, "view": "summary", "sort": "created_at"})
+
+    async def get(self, client):
+        return await client.get(f"/tasks/{self.task_id()}")
+
+    async def search(self, client):
+        return await client.get("/tasks/fulltext", params={"q": self.rng.choice(WORDS), "limit": 20})
+
+    async def create(self, client):
+        resp = await client.post("/tasks/", json=make_task(self.rng, self.max_task_id + 1).dict())
+        if resp.status_code == 200:
+            self.max_task_id = max(self.max_task_id, resp.json()["id"])
+        return resp
+
+    async def update(self, client):
+        return await client.put(f"/tasks/{self.task_id()}", json={"status": self.rng.choice(STATUSES)})
+
+    async def upload(self, client):
+        resp = await client.post(f"/tasks/{self.task_id()}/attachments/",
+                                 files={"file": attachment_file(self.rng, self.rng.randint(0, 10 ** 6))})
+        if resp.status_code == 200:
+            self.attachment_ids.append(resp.json()["id"])
+        return resp
+
+    async def download(self, client):
+        if not self.attachment_ids:
+            return await self.get(client)
+        return await client.get(f"/attachments/{self.rng.choice(self.attachment_ids)}/download")
+
+    async def ai_analysis(self, client):
+        return await client.post("/ai_data_analysis/", json={"prompt": f"{self.rng.choice(WORDS)}相关任务的完成情况如何"})
+
+    async def ai_generate(self, client):
+        return await client.post("/ai_generate_tasks/", json={"prompt": f"筹备一次{self.rng.choice(WORDS)}评审"})
+
+def parse_mix(text: str):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"未知操作: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def summarize(latencies, errors: Counter, elapsed):
+    if not latencies:
+        return {"requests": 0, "errors": sum(errors.values()), "error_codes": dict(errors)}
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "error_codes": dict(errors),  # 状态码（或异常类型）-> 次数
+        "rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+async def drive(client, workload: Workload, mix: dict, concurrency: int, duration: float, warmup: float):
+    """
+    concurrency 个协程各自循环：按权重抽一个操作、发请求、记录耗时；预热期间的请求不计入结果。
+    """
+    names, weights = list(mix), list(mix.values())
+    latencies = {name: [] for name in names}
+    errors = {name: Counter() for name in names}
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+
+    async def worker():
+        while True:
+            name = workload.rng.choices(names, weights)[0]
+            start = time.monotonic()
+            if start >= stop_at:
+                return
+            try:
+                resp = await getattr(workload, name)(client)
+                error = str(resp.status_code) if resp.status_code >= 400 else None
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            if start >= measure_from:
+                latencies[name].append(time.monotonic() - start)
+                if error:
+                    errors[name][error] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    endpoints = {name: summarize(latencies[name], errors[name], duration) for name in names}
+    all_latencies = [value for samples in latencies.values() for value in samples]
+    return endpoints, summarize(all_latencies, sum(errors.values(), Counter()), duration)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args, data_dir: str):
+    scenario = SCENARIOS[args.scenario]
+    n_tasks = args.tasks or scenario["tasks"]
+    n_attachments = scenario["attachments"] if args.attachments is None else args.attachments
+    rng = random.Random(args.seed)
+    process, stub = None, None
+    base_url = args.url
+    if base_url is None:
+        db_url = f"sqlite:///{os.path.join(data_dir, f'bench_{n_tasks}.db')}"
+        seed(db_url, n_tasks)
+        stub, llm_url = stub_llm.start(latency=args.llm_latency, jitter=args.llm_jitter)
+        process = start_server(data_dir, db_url, llm_url, args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            await wait_ready(client, process)
+            attachment_ids = await seed_attachments(client, rng, n_tasks, n_attachments)
+            mix = parse_mix(args.mix)
+            print(f"running {args.concurrency} clients for {args.warmup:g}s warmup + {args.duration:g}s", file=sys.stderr)
+            endpoints, total = await drive(client, Workload(rng, n_tasks, attachment_ids), mix,
+                                           args.concurrency, args.duration, args.warmup)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if stub is not None:
+            stub.shutdown()
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "scenario": args.scenario,
+            "tasks": n_tasks,
+            "attachments": n_attachments,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "server_workers": args.workers,
+            "llm_latency": args.llm_latency,
+            "mix": parse_mix(args.mix),
+        },
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="1k")
+    parser.add_argument("--tasks", type=int, help="任务数，覆盖场景默认值")
+    parser.add_argument("--attachments", type=int, help="预置附件数，覆盖场景默认值")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=30, help="计入结果的压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长（秒），不计入结果")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="操作及权重，如 list=40,get=40,search=20")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟大模型每次调用的耗时（秒）")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn 进程数")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60, help="单个请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，固定后各次运行的请求序列一致")
+    parser.add_argument("--data-dir", help="库、附件和索引所在目录，默认用临时目录；指定后可跨次复用")
+    parser.add_argument("--url", help="压测已启动的服务（不建库、不启动模拟大模型），需配合 --tasks 说明库中任务数")
+    parser.add_argument("--output", help="结果JSON写入该文件，默认输出到标准输出")
+    args = parser.parse_args()
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        result = asyncio.run(run(args, args.data_dir))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = asyncio.run(run(args, tmp))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
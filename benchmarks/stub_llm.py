@@ -0,0 +1,92 @@
+"""
+本地模拟的 DeepSeek（OpenAI 兼容）对话接口，供压测使用：按配置的延迟返回固定内容，支持 stream=true。
+拆解任务的请求返回任务JSON数组，其余返回一段分析文本。
+
+    python -m benchmarks.stub_llm [--port 9100] [--latency 0.5] [--jitter 0.2] [--error-rate 0]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TASKS_REPLY = json.dumps([
+    {"title": f"压测子任务{i}", "description": f"由模拟模型拆解的第{i}个步骤"} for i in range(1, 6)
+], ensure_ascii=False)
+ANALYSIS_REPLY = "结论：任务整体按期推进，已完成占比较高；报表类任务集中在月初，建议提前安排人手。" * 3
+STREAM_CHUNK = 8  # 流式响应每段字符数
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 保持长连接，与真实服务一致
+    latency = 0.5
+    jitter = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if random.random() < self.error_rate:
+            time.sleep(delay / 2)
+            self._reply(503, b'{"error": "stub overloaded"}')
+            return
+        system = next((m["content"] for m in payload.get("messages", []) if m.get("role") == "system"), "")
+        content = TASKS_REPLY if "拆解" in system else ANALYSIS_REPLY
+        if not payload.get("stream"):
+            time.sleep(delay)
+            body = {
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(content), "total_tokens": len(content)},
+            }
+            self._reply(200, json.dumps(body, ensure_ascii=False).encode())
+            return
+        # 流式：延迟均摊到各段之间，首段前等待一段
+        chunks = [content[i:i + STREAM_CHUNK] for i in range(0, len(content), STREAM_CHUNK)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for chunk in chunks:
+            time.sleep(delay / (len(chunks) + 1))
+            event = {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+def start(port: int = 0, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0):
+    """
+    在后台线程启动，返回 (server, 接口地址)；port=0 时随机选端口。用完调用 server.shutdown()。
+    """
+    handler = type("Handler", (StubHandler,), {"latency": latency, "jitter": jitter, "error_rate": error_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.5, help="每次调用的平均耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="耗时在 ±jitter 秒内均匀抖动")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的比例")
+    args = parser.parse_args()
+    server, url = start(args.port, args.latency, args.jitter, args.error_rate)
+    print(f"DEEPSEEK_API_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
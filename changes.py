@@ -0,0 +1,89 @@
+import datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+from models import Task, Attachment, ChangeLog
+import config
+
+# 增量同步：写操作在同一事务内记一条变更，客户端按 seq 水位拉取之后的变更
+# 每个实体只保留最新一条，日志规模与实体数（含删除墓碑）成正比，拉取时也无需再去重
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+def record(db: Session, entity: str, entity_ids, op: str, task_id: int = None):
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    db.query(ChangeLog).filter(
+        ChangeLog.entity == entity, ChangeLog.entity_id.in_(entity_ids)
+    ).delete(synchronize_session=False)
+    now = datetime.datetime.utcnow()
+    # Core executemany：驱动合并为多行 INSERT，不逐行取回自增 seq
+    db.execute(insert(ChangeLog), [
+        {"entity": entity, "entity_id": entity_id, "op": op, "task_id": task_id, "changed_at": now}
+        for entity_id in entity_ids
+    ])
+
+def record_attachments(db: Session, attachments, op: str):
+    for attachment in attachments:
+        record(db, "attachment", [attachment.id], op, task_id=attachment.task_id)
+
+def backfill(db: Session):
+    """
+    为已有任务和附件补记 upsert，使 since=0 的首次同步拿到全量。
+    """
+    task_ids = [task_id for task_id, in db.query(Task.id).order_by(Task.updated_at, Task.id)]
+    record(db, "task", task_ids, UPSERT)
+    attachments = db.query(Attachment.id, Attachment.task_id).order_by(Attachment.id).all()
+    if attachments:
+        db.execute(insert(ChangeLog), [
+            {"entity": "attachment", "entity_id": attachment_id, "op": UPSERT, "task_id": task_id}
+            for attachment_id, task_id in attachments
+        ])
+    db.commit()
+
+def read(db: Session, since: int, limit: int, entity: str = None):
+    """
+    按 seq 顺序读取 since 之后已稳定的变更，返回 (变更列表, 是否还有更多)。
+    seq 在插入时分配，并发事务可能后分配先提交：读者若此时把水位推过去，之后提交的小 seq 就再也读不到。
+    因此截止到第一条仍在安全窗口（CHANGES_SAFE_SECONDS）内的变更，窗口内的留到下次读取。
+    """
+    query = db.query(ChangeLog).filter(ChangeLog.seq > since)
+    if entity is not None:
+        query = query.filter(ChangeLog.entity == entity)
+    entries = query.order_by(ChangeLog.seq).limit(limit + 1).all()
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=config.CHANGES_SAFE_SECONDS)
+    for i, entry in enumerate(entries):
+        if entry.changed_at is None or entry.changed_at > cutoff:
+            return entries[:i], False
+    return entries[:limit], len(entries) > limit
+
+def feed(db: Session, since: int = 0, limit: int = 500):
+    """
+    返回 seq > since 的变更：tasks/attachments 为当前内容，deleted 为删除墓碑。
+    next_since 作为下次请求的 since；has_more 为真时应立即继续拉取。最近几秒内的变更在下次请求时返回（见 read）。
+    """
+    entries, has_more = read(db, since, limit)
+    task_ids = [e.entity_id for e in entries if e.entity == "task" and e.op == UPSERT]
+    attachment_ids = [e.entity_id for e in entries if e.entity == "attachment" and e.op == UPSERT]
+    tasks = (
+        db.query(Task).options(selectinload(Task.attachments))
+        .filter(Task.id.in_(task_ids)).order_by(Task.id).all()
+        if task_ids else []
+    )
+    attachments = (
+        db.query(Attachment).filter(Attachment.id.in_(attachment_ids)).order_by(Attachment.id).all()
+        if attachment_ids else []
+    )
+    deleted = [
+        {"seq": e.seq, "entity": e.entity, "id": e.entity_id, "task_id": e.task_id, "deleted_at": e.changed_at}
+        for e in entries if e.op == DELETE
+    ]
+    return {
+        "since": since,
+        "next_since": entries[-1].seq if entries else since,
+        "has_more": has_more,
+        "tasks": tasks,
+        "attachments": attachments,
+        "deleted": deleted,
+    }
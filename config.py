@@ -0,0 +1,85 @@
+import os
+
+# 运行配置，均可通过同名环境变量覆盖
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+# DeepSeek 大模型
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")  # 必须通过环境变量提供，未配置时调用大模型会报错
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+
+# LLM 客户端：超时（秒）、并发上限、连接池大小、重试次数与退避基数（秒）
+LLM_TIMEOUT = _float("LLM_TIMEOUT", 30)
+LLM_MAX_CONCURRENCY = _int("LLM_MAX_CONCURRENCY", 8)
+LLM_MAX_CONNECTIONS = _int("LLM_MAX_CONNECTIONS", 16)
+LLM_MAX_RETRIES = _int("LLM_MAX_RETRIES", 2)
+LLM_RETRY_BACKOFF = _float("LLM_RETRY_BACKOFF", 0.5)
+
+# LLM 响应缓存：内存条数上限、有效期（秒）、SQLite 持久化路径（留空则只用内存）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = _int("LLM_CACHE_MAX_ENTRIES", 1024)
+LLM_CACHE_TTL = _float("LLM_CACHE_TTL", 3600)
+LLM_CACHE_SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH", "")
+
+# 附件存储：上传目录、单文件大小上限（字节）、批量上传请求总大小上限（字节）、流式读写块大小（字节）
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = _int("MAX_UPLOAD_BYTES", 100 * 1024 * 1024)
+MAX_UPLOAD_REQUEST_BYTES = _int("MAX_UPLOAD_REQUEST_BYTES", 500 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = _int("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+DOWNLOAD_CACHE_MAX_AGE = _int("DOWNLOAD_CACHE_MAX_AGE", 3600)
+
+# 图片缩略图：边长档位（像素）、后台生成线程数
+THUMBNAIL_SIZES = tuple(int(s) for s in os.getenv("THUMBNAIL_SIZES", "128,512").split(","))
+THUMBNAIL_WORKERS = _int("THUMBNAIL_WORKERS", 2)
+
+# 数据库：主库地址、只读副本地址（留空则读写都走主库）、连接池参数、是否打印SQL
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://root:@192.168.5.124:4000/myassistant")
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+DB_POOL_SIZE = _int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _float("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# 同步引擎只服务线程池里的检索打分/统计/分析上下文、任务增删改（分词建索引、删文件）和脚本，连接池比接口用的异步引擎小
+DB_SYNC_POOL_SIZE = _int("DB_SYNC_POOL_SIZE", 4)
+DB_SYNC_MAX_OVERFLOW = _int("DB_SYNC_MAX_OVERFLOW", 4)
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+# 增量同步的安全窗口（秒）：seq 在插入时分配、提交有先后，最近这段时间内的变更暂不下发，
+# 等较早分配 seq 但较晚提交的事务落地，读者按水位推进时不会跳过它们；应大于最长的写事务耗时
+CHANGES_SAFE_SECONDS = _float("CHANGES_SAFE_SECONDS", 5)
+
+# 语义检索：向量索引目录、向量器（hashing 或 "模块:类"）、向量维度、启用IVF分区的任务数阈值、每次查询探查的分区数
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", "semantic_index")
+SEMANTIC_EMBEDDER = os.getenv("SEMANTIC_EMBEDDER", "hashing")
+SEMANTIC_DIM = _int("SEMANTIC_DIM", 256)
+SEMANTIC_IVF_THRESHOLD = _int("SEMANTIC_IVF_THRESHOLD", 50000)
+SEMANTIC_IVF_NPROBE = _int("SEMANTIC_IVF_NPROBE", 16)
+
+# 附件文本抽取：子进程数、排队上限（满了丢弃，之后用 python -m extraction 补做）、单文件超时（秒）、每个附件保留的字符数上限
+EXTRACT_WORKERS = _int("EXTRACT_WORKERS", 2)
+EXTRACT_QUEUE_SIZE = _int("EXTRACT_QUEUE_SIZE", 100)
+EXTRACT_TIMEOUT = _float("EXTRACT_TIMEOUT", 60)
+EXTRACT_MAX_CHARS = _int("EXTRACT_MAX_CHARS", 50000)
+
+# AI数据分析：附带任务数据上下文的token预算（估算值）、检索候选任务数
+ANALYSIS_CONTEXT_TOKENS = _int("ANALYSIS_CONTEXT_TOKENS", 3000)
+ANALYSIS_RETRIEVE_LIMIT = _int("ANALYSIS_RETRIEVE_LIMIT", 50)
+
+# AI任务队列：并发执行的任务数、单个任务超时（秒）、最多尝试次数、重试退避基数（秒）、空闲轮询间隔（秒）、队列专用连接池大小
+AI_JOB_WORKERS = _int("AI_JOB_WORKERS", 4)
+AI_JOB_TIMEOUT = _float("AI_JOB_TIMEOUT", 120)
+AI_JOB_MAX_ATTEMPTS = _int("AI_JOB_MAX_ATTEMPTS", 3)
+AI_JOB_RETRY_BACKOFF = _float("AI_JOB_RETRY_BACKOFF", 2)
+AI_JOB_POLL_INTERVAL = _float("AI_JOB_POLL_INTERVAL", 1)
+AI_JOB_DB_POOL_SIZE = _int("AI_JOB_DB_POOL_SIZE", 2)
+
+# 指标：/metrics 输出 Prometheus 文本；慢请求日志阈值（秒，0 关闭），日志中附带最慢的若干条SQL
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_SLOW_REQUEST_SECONDS = _float("METRICS_SLOW_REQUEST_SECONDS", 0)
+METRICS_SLOW_QUERIES = _int("METRICS_SLOW_QUERIES", 5)
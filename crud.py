@@ -1,7 +1,20 @@
-from sqlalchemy.orm import Session
-from models import Task, Attachment
+from sqlalchemy import or_, and_, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload, load_only, raiseload
+from models import Task, Attachment, AttachmentText
 from schemas import TaskCreate, TaskUpdate
+import base64
 import datetime
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+import fulltext
+import tags as task_tags
+import storage
+import previews
+import changes
 
 # 任务相关
 
@@ -16,15 +29,250 @@ def create_task(db: Session, task: TaskCreate):
         completed_at=task.completed_at
     )
     db.add(db_task)
+    db.flush()
+    fulltext.index_task(db, db_task)
+    task_tags.sync_task(db, db_task)
+    changes.record(db, "task", [db_task.id], changes.UPSERT)
     db.commit()
+    invalidate_stats()
     db.refresh(db_task)
     return db_task
 
+INSERT_BATCH_SIZE = 1000  # 多行 INSERT 每条语句的行数，避免超过 max_allowed_packet
+
+BULK_TASK_COLUMNS = ("title", "description", "type", "priority", "priority_rank", "tags", "status", "completed_at")
+
+def _insert_tasks(db: Session, rows: list) -> list:
+    """
+    多行 INSERT 写入任务，每批一条 INSERT ... VALUES (...), (...)，返回与 rows 顺序一致的新id。
+    一条语句分到的自增id不保证连续（auto_increment_increment>1、交错锁模式、TiDB 按节点分段分配），
+    也不能靠排序对应行：每行带一个随机的 insert_token，支持 RETURNING 的方言随 INSERT 取回 (id, token)，
+    否则（MySQL/TiDB）按该批 token 再查一次，按 token 对应回行。
+    """
+    returning = db.get_bind().dialect.insert_returning
+    ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch_token = uuid.uuid4().hex
+        batch = [{**row, "insert_token": f"{batch_token}:{i}"} for i, row in enumerate(rows[start:start + INSERT_BATCH_SIZE])]
+        tokens = [row["insert_token"] for row in batch]
+        if returning:
+            inserted = db.execute(insert(Task).values(batch).returning(Task.id, Task.insert_token)).all()
+        else:
+            db.execute(insert(Task).values(batch))
+            inserted = db.query(Task.id, Task.insert_token).filter(Task.insert_token.in_(tokens)).all()
+        token_ids = {token: task_id for task_id, token in inserted}
+        ids.extend(token_ids[token] for token in tokens)
+    return ids
+
+def create_tasks_bulk(db: Session, tasks: list):
+    """
+    单事务批量创建任务，返回新任务id列表（与输入顺序一致）。
+    任务用多行 INSERT 写入（见 _insert_tasks），不经 ORM 逐行 flush；全文索引、标签、变更日志同样批量写入，只提交一次。
+    """
+    # 借 ORM 对象补齐 priority_rank，对象本身不加入会话，只供后续建索引和标签使用
+    new_tasks = [
+        Task(
+            title=task.title,
+            description=task.description,
+            type=task.type,
+            priority=task.priority,
+            tags=task.tags,
+            status=task.status,
+            completed_at=task.completed_at
+        )
+        for task in tasks
+    ]
+    if not new_tasks:
+        return []
+    try:
+        ids = _insert_tasks(db, [{c: getattr(t, c) for c in BULK_TASK_COLUMNS} for t in new_tasks])
+        for task, task_id in zip(new_tasks, ids):
+            task.id = task_id
+        fulltext.index_new_tasks(db, new_tasks)
+        task_tags.sync_new_tasks(db, new_tasks)
+        changes.record(db, "task", ids, changes.UPSERT)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_stats()
+    return ids
+
+# 列表视图：full 用一条 IN 查询批量加载附件；summary 不取附件和大字段 description
+SUMMARY_COLUMNS = (
+    Task.id, Task.title, Task.type, Task.status, Task.priority, Task.priority_rank, Task.tags,
+    Task.created_at, Task.updated_at, Task.completed_at,
+)
+
+def _with_view(query, view: str = "full"):
+    if view == "summary":
+        # 精简模型不含附件；误读附件时报错，而不是悄悄发起 N+1 查询或给出空列表
+        return query.options(load_only(*SUMMARY_COLUMNS), raiseload(Task.attachments))
+    return query.options(selectinload(Task.attachments))
+
 def get_task(db: Session, task_id: int):
-    return db.query(Task).filter(Task.id == task_id).first()
+    return _with_view(db.query(Task)).filter(Task.id == task_id).first()
+
+def get_tasks(db: Session, skip: int = 0, limit: int = 100, view: str = "full", tag: str = None):
+    query = db.query(Task)
+    if tag:
+        query = task_tags.filter_by_tag(query, tag)
+    return _with_view(query, view).offset(skip).limit(limit).all()
+
+# 游标分页：游标为 (排序字段, 方向, 排序值, id) 的base64编码，查询变为在(排序列, id)索引上的seek；
+# 按优先级排序时用数值的 priority_rank
+CURSOR_SORT_COLUMNS = {
+    "created_at": Task.created_at,
+    "updated_at": Task.updated_at,
+    "priority": Task.priority_rank,
+}
+
+def _encode_cursor(sort: str, order: str, value, task_id: int):
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, task_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    # 游标来自客户端，任何解析失败都按无效游标处理（接口返回400）
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort, order, value, task_id = json.loads(raw)
+        if sort not in CURSOR_SORT_COLUMNS or order not in ("asc", "desc") or not isinstance(task_id, int):
+            raise ValueError("invalid cursor")
+        if sort == "priority":
+            if not isinstance(value, int):
+                raise ValueError("invalid cursor")
+        else:
+            value = datetime.datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    return sort, order, value, task_id
+
+def get_tasks_page(db: Session, sort: str = "created_at", order: str = "desc", cursor: str = None, limit: int = 100,
+                   view: str = "full", tag: str = None):
+    # 游标中自带排序方式，传入游标时以游标为准；返回(当前页, 下一页游标)
+    if cursor:
+        sort, order, value, last_id = _decode_cursor(cursor)
+    column = CURSOR_SORT_COLUMNS[sort]
+    query = _with_view(db.query(Task), view)
+    if tag:
+        query = task_tags.filter_by_tag(query, tag)
+    if cursor:
+        if order == "desc":
+            query = query.filter(or_(column < value, and_(column == value, Task.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Task.id > last_id)))
+    if order == "desc":
+        query = query.order_by(column.desc(), Task.id.desc())
+    else:
+        query = query.order_by(column.asc(), Task.id.asc())
+    # 多取一行用于判断是否还有下一页
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = _encode_cursor(sort, order, getattr(last, column.key), last.id)
+    return items, next_cursor
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_tasks(db: Session, keyword: str = None, statuses: list = None, type: str = None,
+                 priority: str = None, created_from: datetime.date = None, created_to: datetime.date = None,
+                 skip: int = 0, limit: int = 100, view: str = "full", tag: str = None):
+    # 所有筛选条件下推到SQL，返回(总数, 当前页)
+    query = db.query(Task)
+    if tag:
+        query = task_tags.filter_by_tag(query, tag)
+    if keyword:
+        # 关键词按字面匹配：用户输入的 % 和 _ 不能当通配符
+        pattern = f"%{_escape_like(keyword)}%"
+        query = query.filter(or_(Task.title.like(pattern, escape="\\"), Task.description.like(pattern, escape="\\"),
+                                 Task.tags.like(pattern, escape="\\")))
+    if statuses:
+        query = query.filter(Task.status.in_(statuses))
+    if type:
+        query = query.filter(Task.type == type)
+    if priority:
+        query = query.filter(Task.priority == priority)
+    if created_from:
+        query = query.filter(Task.created_at >= datetime.datetime.combine(created_from, datetime.time.min))
+    if created_to:
+        # 结束日期按整天包含
+        query = query.filter(Task.created_at < datetime.datetime.combine(created_to + datetime.timedelta(days=1), datetime.time.min))
+    total = query.order_by(None).count()
+    items = _with_view(query, view).order_by(Task.created_at.desc(), Task.id.desc()).offset(skip).limit(limit).all()
+    return total, items
 
-def get_tasks(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Task).offset(skip).limit(limit).all()
+def fulltext_search(db: Session, query: str, limit: int = 20):
+    # 按BM25得分排序返回[(得分, 任务)]
+    return get_scored_tasks(db, fulltext.search(db, query, limit=limit))
+
+def get_scored_tasks(db: Session, hits: list):
+    # [(任务id, 得分)] -> [(得分, 任务)]，保持原顺序，已删除的任务跳过
+    if not hits:
+        return []
+    tasks = {t.id: t for t in _with_view(db.query(Task)).filter(Task.id.in_([task_id for task_id, _ in hits])).all()}
+    return [(score, tasks[task_id]) for task_id, score in hits if task_id in tasks]
+
+# 任务统计：几条聚合SQL算出，结果在进程内缓存，任务写操作时失效
+STATS_TTL_SECONDS = 60  # 兜底过期，覆盖其他进程写入的情况
+_stats_cache = {}
+_stats_lock = threading.Lock()
+_stats_generation = 0  # 每次失效加一；查询期间发生过失效的结果不写入缓存
+
+def invalidate_stats():
+    global _stats_generation
+    with _stats_lock:
+        _stats_generation += 1
+        _stats_cache.clear()
+
+def get_task_stats(db: Session, days: int = 30, weeks: int = 12):
+    key = (days, weeks)
+    with _stats_lock:
+        cached = _stats_cache.get(key)
+        generation = _stats_generation
+    if cached and time.monotonic() - cached[0] < STATS_TTL_SECONDS:
+        return cached[1]
+    by_status, by_type, by_priority, by_tag = Counter(), Counter(), Counter(), Counter()
+    rows = db.query(Task.status, Task.type, Task.priority, func.count(Task.id)) \
+        .group_by(Task.status, Task.type, Task.priority).all()
+    for status, type_, priority, count in rows:
+        by_status[status] += count
+        by_type[type_] += count
+        by_priority[priority] += count
+    by_tag.update(dict(task_tags.facet_counts(db, limit=None)))
+    today = datetime.datetime.utcnow().date()
+    since = today - datetime.timedelta(days=max(days, weeks * 7) - 1)
+    day_column = func.date(Task.completed_at)
+    completed_rows = db.query(day_column, func.count(Task.id)) \
+        .filter(Task.completed_at >= datetime.datetime.combine(since, datetime.time.min)) \
+        .group_by(day_column).all()
+    per_day, per_week = {}, Counter()
+    day_since = today - datetime.timedelta(days=days - 1)
+    for day, count in completed_rows:
+        # SQLite 返回字符串，MySQL/TiDB 返回 date
+        if isinstance(day, str):
+            day = datetime.date.fromisoformat(day)
+        if day >= day_since:
+            per_day[day.isoformat()] = count
+        year, week, _ = day.isocalendar()
+        per_week[f"{year}-W{week:02d}"] += count
+    result = {
+        "total": sum(by_status.values()),
+        "by_status": dict(by_status),
+        "by_type": dict(by_type),
+        "by_priority": dict(by_priority),
+        "by_tag": dict(by_tag.most_common()),
+        "completed_per_day": dict(sorted(per_day.items())),
+        "completed_per_week": dict(sorted(per_week.items())),
+    }
+    with _stats_lock:
+        if generation == _stats_generation:
+            _stats_cache[key] = (time.monotonic(), result)
+    return result
 
 def update_task(db: Session, task_id: int, task: TaskUpdate):
     db_task = db.query(Task).filter(Task.id == task_id).first()
@@ -36,30 +284,138 @@ def update_task(db: Session, task_id: int, task: TaskUpdate):
     db_task.updated_at = datetime.datetime.utcnow()
     if task.status == 'completed' and not db_task.completed_at:
         db_task.completed_at = datetime.datetime.utcnow()
+    fulltext.index_task(db, db_task)
+    if task.tags is not None:
+        task_tags.sync_task(db, db_task)
+    changes.record(db, "task", [task_id], changes.UPSERT)
     db.commit()
+    invalidate_stats()
     db.refresh(db_task)
     return db_task
 
 def delete_task(db: Session, task_id: int):
     db_task = db.query(Task).filter(Task.id == task_id).first()
     if db_task:
+        attachments = list(db_task.attachments)
+        fulltext.remove_task(db, task_id)
+        task_tags.remove_task(db, task_id)
+        db.query(AttachmentText).filter(AttachmentText.task_id == task_id).delete(synchronize_session=False)
+        # 任务删除后其附件不再可达：附件记录一并删除并释放内容引用，记删除
+        blobs, paths = _release_attachments(db, attachments)
+        changes.record_attachments(db, attachments, changes.DELETE)
+        changes.record(db, "task", [task_id], changes.DELETE)
+        for attachment in attachments:
+            db.delete(attachment)
         db.delete(db_task)
         db.commit()
+        invalidate_stats()
+        _collect_files(db, blobs, paths)
     return db_task
 
 # 附件相关
 
-def create_attachment(db: Session, filename: str, filepath: str, filetype: str, task_id: int):
-    db_attachment = Attachment(
-        filename=filename,
-        filepath=filepath,
-        filetype=filetype,
-        task_id=task_id
-    )
-    db.add(db_attachment)
-    db.commit()
+def create_attachment(db: Session, filename: str, filepath: str, filetype: str, task_id: int,
+                      size: int = None, sha256: str = None):
+    # 两个请求同时首次上传相同内容时，后提交的一方会撞上 blobs 主键，重试一次即转为累加引用
+    for attempt in range(2):
+        db_attachment = Attachment(
+            filename=filename,
+            filepath=filepath,
+            filetype=filetype,
+            size=size,
+            sha256=sha256,
+            task_id=task_id
+        )
+        db.add(db_attachment)
+        if sha256 and storage.is_blob_path(filepath):
+            storage.acquire_blob(db, sha256, size)
+        try:
+            db.flush()
+            changes.record_attachments(db, [db_attachment], changes.UPSERT)
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
     db.refresh(db_attachment)
     return db_attachment
 
+def create_attachments_bulk(db: Session, task_id: int, files: list):
+    """
+    单事务批量创建附件记录，files 为 dict(filename, filepath, filetype, size, sha256) 列表。
+    同一批内相同内容的引用数合并后一次累加。
+    """
+    blob_refs = Counter()
+    blob_sizes = {}
+    for f in files:
+        if f.get("sha256") and storage.is_blob_path(f["filepath"]):
+            blob_refs[f["sha256"]] += 1
+            blob_sizes[f["sha256"]] = f["size"]
+    for attempt in range(2):
+        db_attachments = [Attachment(task_id=task_id, **f) for f in files]
+        db.add_all(db_attachments)
+        for sha256, count in blob_refs.items():
+            storage.acquire_blob(db, sha256, blob_sizes[sha256], count)
+        try:
+            db.flush()
+            changes.record(db, "attachment", [a.id for a in db_attachments], changes.UPSERT, task_id=task_id)
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+    return db_attachments
+
+def get_tag_facets(db: Session, limit: int = 100):
+    return [{"name": name, "count": count} for name, count in task_tags.facet_counts(db, limit=limit)]
+
+def get_attachment(db: Session, attachment_id: int):
+    return db.query(Attachment).filter(Attachment.id == attachment_id).first()
+
+def _release_attachments(db: Session, attachments):
+    """
+    在调用方事务内释放附件的内容引用，返回 (待回收的sha256, 需直接删除的文件路径)，提交后交给 _collect_files。
+    """
+    blobs = Counter()
+    paths = []
+    for attachment in attachments:
+        if attachment.sha256 and storage.is_blob_path(attachment.filepath):
+            blobs[attachment.sha256] += 1
+        else:
+            # 内容寻址存储上线前上传的文件，每条附件独占
+            paths.append(attachment.filepath)
+    for sha256, count in blobs.items():
+        storage.release_blob(db, sha256, count)
+    return list(blobs), paths
+
+def _collect_files(db: Session, blobs: list, paths: list):
+    # 提交后回收文件及其缩略图：内容文件仅在复查到已无引用时删除
+    for sha256 in blobs:
+        if storage.collect_blob(db, sha256):
+            previews.remove_thumbnails(storage.blob_path(sha256))
+    for path in paths:
+        storage.remove_file(path)
+        previews.remove_thumbnails(path)
+
+def delete_attachment(db: Session, attachment: Attachment):
+    """
+    删除附件记录并释放其内容引用；提交后回收已无引用的文件（内容仍被其他附件引用时保留）。
+    """
+    blobs, paths = _release_attachments(db, [attachment])
+    changes.record_attachments(db, [attachment], changes.DELETE)
+    # 附件文本已并入任务的检索词项，删除后重建
+    extracted = db.query(AttachmentText).filter(AttachmentText.attachment_id == attachment.id).delete(synchronize_session=False)
+    if extracted and attachment.task is not None:
+        fulltext.index_task(db, attachment.task)
+        changes.record(db, "task", [attachment.task_id], changes.UPSERT)
+    db.delete(attachment)
+    db.commit()
+    _collect_files(db, blobs, paths)
+
+def get_changes(db: Session, since: int = 0, limit: int = 500):
+    return changes.feed(db, since=since, limit=limit)
+
 def get_attachments_by_task(db: Session, task_id: int):
     return db.query(Attachment).filter(Attachment.task_id == task_id).all() 
\ No newline at end of file
@@ -0,0 +1,110 @@
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool, QueuePool, AsyncAdaptedQueuePool
+import time
+import config
+import metrics
+
+# 数据库引擎与会话：连接池参数来自配置，只读接口可路由到副本；SQLite 地址用于本地运行和测试
+
+# 连接池：记录每次取连接的耗时（含池满时的等待），用于区分慢在取连接还是慢在查询
+class TimedQueuePool(QueuePool):
+    metrics_name = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_checkout(self.metrics_name, time.perf_counter() - start)
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+def engine_options(url: str) -> dict:
+    options = {"echo": config.DB_ECHO, "pool_pre_ping": config.DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        # 内存库每个连接都是独立的库，只能共用一个连接
+        if make_url(url).database in (None, "", ":memory:"):
+            options["poolclass"] = StaticPool
+        return options
+    options.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+    )
+    return options
+
+def make_engine(url: str, **overrides):
+    # overrides 覆盖连接池参数，同 make_async_engine
+    options = engine_options(url)
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(overrides)
+    options.setdefault("poolclass", TimedQueuePool)
+    engine = create_engine(url, **options)
+    metrics.instrument_engine(engine)
+    return engine
+
+# 每个进程同时有三组连接池：同步（线程池中的CPU密集查询、脚本）、异步（接口）、AI任务队列，
+# 连到同一库时单进程最多占用 (DB_SYNC_POOL_SIZE + DB_SYNC_MAX_OVERFLOW) + (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# + 2 * AI_JOB_DB_POOL_SIZE 个连接，配置了副本时同步/异步各再多一组，部署多个 worker 时按进程数相乘
+_sync_pool = {"pool_size": config.DB_SYNC_POOL_SIZE, "max_overflow": config.DB_SYNC_MAX_OVERFLOW}
+engine = make_engine(config.DATABASE_URL, **_sync_pool)
+read_engine = make_engine(config.DATABASE_REPLICA_URL, **_sync_pool) if config.DATABASE_REPLICA_URL else engine
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# 依赖项：获取数据库会话
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db():
+    # 只读接口使用，配置了副本时查询副本
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# 异步引擎与会话：同一配置换成异步驱动，供 async 路由使用；同步路径（脚本、迁移、基准）继续用上面的引擎
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def make_async_engine(url: str, **overrides):
+    # overrides 覆盖连接池参数，如后台任务队列使用独立的小连接池
+    options = engine_options(url)
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(overrides)
+    options.setdefault("poolclass", TimedAsyncQueuePool)
+    engine = create_async_engine(async_url(url), **options)
+    metrics.instrument_engine(engine.sync_engine)
+    return engine
+
+async_engine = make_async_engine(config.DATABASE_URL)
+async_read_engine = make_async_engine(config.DATABASE_REPLICA_URL) if config.DATABASE_REPLICA_URL else async_engine
+
+# expire_on_commit=False：提交后对象仍可在路由里序列化，不会触发异步上下文外的懒加载
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,49 @@
+import importlib
+import math
+import zlib
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+import fulltext
+
+# 本地文本向量化：默认用特征哈希作基线，无需联网和GPU。
+# 自定义向量器通过 SEMANTIC_EMBEDDER="模块:类" 接入，需提供 name、dim 属性和 embed(texts)，
+# embed 返回 float32 矩阵（每行一个文本，已L2归一化）。
+
+@lru_cache(maxsize=200000)
+def _bucket(token: str):
+    h = zlib.crc32(token.encode())
+    return h, 1.0 if h & 0x80000000 else -1.0
+
+class HashingEmbedder:
+    """
+    词项（中文单字+二元组、英文单词，与全文检索同一套切分）哈希到固定维度，
+    带符号哈希抵消碰撞偏差，词频取 1+log(tf)。
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(fulltext.tokenize(text))
+            if not counts:
+                continue
+            index = np.empty(len(counts), dtype=np.int64)
+            values = np.empty(len(counts), dtype=np.float32)
+            for i, (token, tf) in enumerate(counts.items()):
+                h, sign = _bucket(token)
+                index[i] = h % self.dim
+                values[i] = sign * (1.0 + math.log(tf))
+            np.add.at(out[row], index, values)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+def get_embedder(name: str, dim: int):
+    if name == HashingEmbedder.name:
+        return HashingEmbedder(dim)
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
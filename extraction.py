@@ -0,0 +1,233 @@
+"""
+附件文本抽取流水线：上传后投递附件id，后台线程把文件交给常驻抽取子进程解析，
+结果写入 attachment_texts 并重建所属任务的全文索引（语义索引经变更日志随后同步）。
+
+对已有附件补做抽取：
+
+    python -m extraction [--all]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Attachment, AttachmentText, Task
+import changes
+import config
+import database
+import extractors
+import fulltext
+
+logger = logging.getLogger(__name__)
+
+_EXTRACTOR_COMMAND = [sys.executable, os.path.abspath(extractors.__file__)]
+
+class _Worker:
+    """
+    一个常驻抽取子进程（独立解释器，不继承本进程的线程、连接池和已加载模块），按行收发JSON；
+    单个文件超时或子进程崩溃时杀掉重启，不影响其他线程的子进程。
+    """
+
+    def __init__(self):
+        self.process = None
+        self.replies = None
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            _EXTRACTOR_COMMAND, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+        )
+        # 管道读取没有超时参数，由读线程转进队列，在队列上等待
+        self.replies = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process.stdout, self.replies), daemon=True).start()
+
+    @staticmethod
+    def _read(stdout, replies):
+        for line in stdout:
+            replies.put(json.loads(line))
+        replies.put(None)
+
+    def run(self, path: str, kind: str, timeout: float):
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+        try:
+            self.process.stdin.write(json.dumps([path, kind, config.EXTRACT_MAX_CHARS]) + "\n")
+            self.process.stdin.flush()
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            self.stop(kill=True)
+            return extractors.TIMEOUT, f"超过 {timeout:g} 秒未完成"
+        except OSError:
+            reply = None
+        if reply is None:
+            self.stop(kill=True)
+            return extractors.FAILED, "抽取进程异常退出"
+        return reply
+
+    def stop(self, kill: bool = False):
+        if self.process is None:
+            return
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+_queue = queue.Queue(maxsize=config.EXTRACT_QUEUE_SIZE)
+_threads = []
+_threads_lock = threading.Lock()
+
+def _ensure_started():
+    with _threads_lock:
+        if _threads:
+            return
+        for i in range(config.EXTRACT_WORKERS):
+            thread = threading.Thread(target=_run, name=f"extract-{i}", daemon=True)
+            thread.start()
+            _threads.append(thread)
+
+def _run():
+    worker = _Worker()
+    while True:
+        attachment_id = _queue.get()
+        try:
+            if attachment_id is None:
+                worker.stop()
+                return
+            process(attachment_id, worker)
+        except Exception:
+            logger.exception("附件文本抽取失败: %s", attachment_id)
+        finally:
+            _queue.task_done()
+
+def schedule(attachment_id: int) -> bool:
+    """
+    投递抽取任务，立即返回；队列已满时丢弃并返回False，之后可用 python -m extraction 补做。
+    """
+    _ensure_started()
+    try:
+        _queue.put_nowait(attachment_id)
+        return True
+    except queue.Full:
+        logger.warning("抽取队列已满，跳过附件 %s", attachment_id)
+        return False
+
+def _text_by_content(db: Session, sha256: str):
+    # 相同内容的附件已抽取过时直接复用
+    if not sha256:
+        return None
+    row = (
+        db.query(AttachmentText.text)
+        .join(Attachment, Attachment.id == AttachmentText.attachment_id)
+        .filter(Attachment.sha256 == sha256, AttachmentText.status == extractors.DONE)
+        .first()
+    )
+    return row.text if row else None
+
+def process(attachment_id: int, worker: _Worker):
+    with database.SessionLocal() as db:
+        attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+        if attachment is None:
+            return
+        task_id, path, sha256 = attachment.task_id, attachment.filepath, attachment.sha256
+        kind = extractors.kind_of(attachment.filename, attachment.filetype)
+        if kind is None:
+            status, payload = extractors.UNSUPPORTED, "不支持的格式"
+        else:
+            payload = _text_by_content(db, sha256)
+            status = extractors.DONE
+            if payload is None:
+                # 解析期间不占用数据库连接
+                db.rollback()
+                status, payload = worker.run(path, kind, config.EXTRACT_TIMEOUT)
+        _save(db, attachment_id, task_id, status, payload)
+
+def _save(db: Session, attachment_id: int, task_id: int, status: str, payload: str):
+    # 同一附件被并发抽取（如上传与补做同时进行）时，后插入的一方撞上主键：回滚重试一次即转为更新，结果总能写入
+    for attempt in range(2):
+        try:
+            if not _write(db, attachment_id, task_id, status, payload):
+                return
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+    logger.info("附件 %s 抽取结果: %s", attachment_id, status)
+
+def _write(db: Session, attachment_id: int, task_id: int, status: str, payload: str) -> bool:
+    # 抽取期间附件可能已被删除
+    if db.query(Attachment.id).filter(Attachment.id == attachment_id).first() is None:
+        return False
+    row = db.query(AttachmentText).filter(AttachmentText.attachment_id == attachment_id).first()
+    if row is None:
+        row = AttachmentText(attachment_id=attachment_id)
+        db.add(row)
+    done = status == extractors.DONE
+    row.task_id = task_id
+    row.status = status
+    row.text = payload if done else None
+    row.chars = len(payload) if done else 0
+    row.error = None if done else payload[:255]
+    row.extracted_at = datetime.datetime.utcnow()
+    db.flush()
+    if done and task_id:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if task is not None:
+            fulltext.index_task(db, task)
+            changes.record(db, "task", [task_id], changes.UPSERT)
+    return True
+
+def pending_attachment_ids(db: Session, redo_all: bool = False):
+    query = db.query(Attachment.id).outerjoin(AttachmentText, AttachmentText.attachment_id == Attachment.id)
+    if not redo_all:
+        query = query.filter((AttachmentText.attachment_id.is_(None)) | (AttachmentText.status != extractors.DONE))
+    return [attachment_id for attachment_id, in query.order_by(Attachment.id)]
+
+def reindex(redo_all: bool = False) -> int:
+    """
+    对尚未成功抽取的附件（redo_all 时为全部附件）补做抽取，阻塞到全部完成，返回处理数。
+    """
+    with database.SessionLocal() as db:
+        attachment_ids = pending_attachment_ids(db, redo_all)
+    _ensure_started()
+    for attachment_id in attachment_ids:
+        _queue.put(attachment_id)
+    _queue.join()
+    return len(attachment_ids)
+
+def shutdown():
+    for _ in _threads:
+        try:
+            _queue.put_nowait(None)
+        except queue.Full:
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="重新抽取全部附件（默认只处理未成功的）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    import migrations
+    from models import Base
+    Base.metadata.create_all(bind=database.engine)
+    migrations.upgrade(database.engine)
+    count = reindex(redo_all=args.all)
+    print(f"已处理 {count} 个附件")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+
+# 附件文本抽取：按格式分派到抽取函数，由 extraction.py 以独立子进程（python extractors.py）运行。
+# 第三方解析库在函数内导入，未安装时该格式记为不支持；每种格式读到 max_chars 个字符即停止。
+
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+UNSUPPORTED = "unsupported"
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".tsv", ".json", ".log", ".xml", ".html", ".htm", ".yaml", ".yml"}
+
+def kind_of(filename: str, filetype: str):
+    """
+    按扩展名（其次按MIME类型）判断格式，不支持的返回None。附件按内容寻址存储，磁盘路径上没有扩展名。
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    filetype = filetype or ""
+    if ext in (".xlsx", ".xlsm") or filetype == XLSX_TYPE:
+        return "xlsx"
+    if ext == ".pdf" or filetype == "application/pdf":
+        return "pdf"
+    if ext == ".docx" or filetype == DOCX_TYPE:
+        return "docx"
+    if ext in TEXT_EXTENSIONS or filetype.startswith("text/"):
+        return "text"
+    return None
+
+class _Buffer:
+    def __init__(self, max_chars: int):
+        self.parts = []
+        self.remaining = max_chars
+
+    def add(self, text) -> bool:
+        """
+        追加一段文本，返回是否还能继续追加。
+        """
+        if text:
+            piece = str(text)[:self.remaining]
+            self.parts.append(piece)
+            self.remaining -= len(piece)
+        return self.remaining > 0
+
+    def text(self) -> str:
+        return "\n".join(self.parts)
+
+def extract_xlsx(path: str, max_chars: int) -> str:
+    from openpyxl import load_workbook
+    buf = _Buffer(max_chars)
+    # 只读模式逐行流式读取，不把整个工作簿载入内存；data_only 取公式的缓存结果。
+    # 传文件对象而不是路径：openpyxl 会按路径扩展名拒绝文件，而存储路径没有扩展名。
+    with open(path, "rb") as f:
+        workbook = load_workbook(f, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                if not buf.add(f"# {sheet.title}"):
+                    break
+                for row in sheet.iter_rows(values_only=True):
+                    cells = [str(value) for value in row if value is not None and str(value).strip()]
+                    if cells and not buf.add("\t".join(cells)):
+                        return buf.text()
+        finally:
+            workbook.close()
+    return buf.text()
+
+def extract_pdf(path: str, max_chars: int) -> str:
+    from pypdf import PdfReader
+    buf = _Buffer(max_chars)
+    for page in PdfReader(path).pages:
+        if not buf.add(page.extract_text()):
+            break
+    return buf.text()
+
+def extract_docx(path: str, max_chars: int) -> str:
+    from docx import Document
+    buf = _Buffer(max_chars)
+    document = Document(path)
+    for paragraph in document.paragraphs:
+        if not buf.add(paragraph.text):
+            return buf.text()
+    for table in document.tables:
+        for row in table.rows:
+            if not buf.add("\t".join(cell.text for cell in row.cells)):
+                return buf.text()
+    return buf.text()
+
+def extract_text(path: str, max_chars: int) -> str:
+    with open(path, "rb") as f:
+        data = f.read(max_chars * 4)
+    try:
+        return data.decode("utf-8-sig")[:max_chars]
+    except UnicodeDecodeError as e:
+        # 截断处正好切在多字节字符中间时，去掉残缺的尾部再解码
+        if len(data) == max_chars * 4 and e.start >= len(data) - 3:
+            return data[:e.start].decode("utf-8-sig")[:max_chars]
+    return data.decode("gb18030", errors="replace")[:max_chars]
+
+EXTRACTORS = {
+    "xlsx": extract_xlsx,
+    "pdf": extract_pdf,
+    "docx": extract_docx,
+    "text": extract_text,
+}
+
+def extract(path: str, kind: str, max_chars: int):
+    """
+    返回 (状态, 文本或错误信息)。
+    """
+    try:
+        return DONE, EXTRACTORS[kind](path, max_chars)
+    except ImportError as e:
+        return UNSUPPORTED, f"缺少依赖: {e.name}"
+    except Exception as e:
+        return FAILED, f"{type(e).__name__}: {e}"
+
+def serve():
+    # 子进程主循环：stdin 每行一个 [路径, 格式, 字符上限]，stdout 每行回一个 [状态, 文本]，stdin 关闭时退出。
+    # 解析库可能往 stdout 打印，协议输出单独保留，其余一律转到 stderr。
+    sys.stdin.reconfigure(encoding="utf-8")
+    out = sys.stdout
+    out.reconfigure(encoding="utf-8")
+    sys.stdout = sys.stderr
+    for line in sys.stdin:
+        out.write(json.dumps(extract(*json.loads(line)), ensure_ascii=False) + "\n")
+        out.flush()
+
+if __name__ == "__main__":
+    serve()
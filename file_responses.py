@@ -0,0 +1,114 @@
+import datetime
+import os
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import config
+
+# 附件下载响应：强ETag、Last-Modified、304条件请求、Cache-Control，以及单段 Range/206 断点续传
+
+CHUNK_SIZE = 64 * 1024
+
+def _http_date(dt: datetime.datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return format_datetime(dt.astimezone(datetime.timezone.utc), usegmt=True)
+
+def _parse_http_date(value: str):
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match 用弱比较：忽略 W/ 前缀
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def _parse_range(header: str, size: int):
+    """
+    解析单段 bytes 范围，返回 (start, end) 闭区间；格式不支持时返回 None（按整文件响应），
+    范围不可满足时抛出 ValueError。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_s, sep, end_s = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_s == "":
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError("unsatisfiable range")
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        if start_s.isdigit() or end_s.isdigit():
+            raise
+        return None
+    if start >= size or start > end:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def file_response(request: Request, path: str, filename: str, media_type: str = None,
+                  etag_value: str = None, last_modified: datetime.datetime = None):
+    stat = os.stat(path)
+    etag = f'"{etag_value}"' if etag_value else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    if last_modified is None:
+        last_modified = datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": _http_date(last_modified),
+        "Cache-Control": f"private, max-age={config.DOWNLOAD_CACHE_MAX_AGE}",
+        "Accept-Ranges": "bytes",
+    }
+
+    # 条件请求：If-None-Match 优先于 If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        since = _parse_http_date(request.headers.get("if-modified-since", ""))
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=datetime.timezone.utc)
+        if since is not None and modified.replace(microsecond=0) <= since:
+            return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range 与当前版本不符时忽略 Range，返回完整文件
+    if range_header and if_range and if_range.strip() != etag and if_range.strip() != headers["Last-Modified"]:
+        range_header = None
+    if range_header:
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                "Content-Length": str(length),
+                "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+            })
+            return StreamingResponse(_iter_file(path, start, length), status_code=206,
+                                     media_type=media_type or "application/octet-stream", headers=headers)
+    return FileResponse(path=path, filename=filename, media_type=media_type, headers=headers, stat_result=stat)
@@ -1,17 +1,27 @@
 import streamlit as st
-import requests
 import pandas as pd
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
 from datetime import datetime
 import time
 from io import BytesIO
 from streamlit_paste_button import paste_image_button as pbutton
-import base64
+import hashlib
+import json
+from api_client import ApiClient
 
 API_URL = "http://localhost:8000"
 
 st.set_page_config(page_title="AI 助理任务管理平台", layout="wide")
 
+def get_api():
+    # 每个浏览器会话一个客户端，各次rerun共用：复用连接，未过期的查询结果直接读缓存。
+    # 不用 st.cache_resource 跨会话共享：各会话的脚本在不同线程中运行，requests.Session 不是线程安全的
+    if "api_client" not in st.session_state:
+        st.session_state["api_client"] = ApiClient(API_URL)
+    return st.session_state["api_client"]
+
+api = get_api()
+
 # 初始化session state
 if "pasted_images" not in st.session_state:
     st.session_state["pasted_images"] = []
@@ -24,16 +34,17 @@ def handle_paste_image():
     try:
         paste_result = pbutton("📋 粘贴图片", key="paste_button")
         if paste_result and paste_result.image_data is not None:
-            # 将图片数据转换为base64以便于存储和显示
+            # 只保存PNG字节和摘要，不再同时持有PIL对象和base64副本
             buffered = BytesIO()
             paste_result.image_data.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
+            png_bytes = buffered.getvalue()
+            digest = hashlib.sha256(png_bytes).hexdigest()
             # 去重：只有新图片才加入
-            existed_base64 = [img["base64"] for img in st.session_state["pasted_images"]]
-            if img_str not in existed_base64:
+            existed_digests = [img["digest"] for img in st.session_state["pasted_images"]]
+            if digest not in existed_digests:
                 st.session_state["pasted_images"].append({
-                    "image": paste_result.image_data,
-                    "base64": img_str
+                    "png": png_bytes,
+                    "digest": digest
                 })
                 st.success("图片已成功粘贴！")
             else:
@@ -47,11 +58,26 @@ def display_pasted_images():
         cols = st.columns(3)  # 每行显示3张图片
         for idx, img_data in enumerate(st.session_state["pasted_images"]):
             with cols[idx % 3]:
-                st.image(img_data["image"], caption=f"第{idx+1}张", use_column_width=True)
+                st.image(img_data["png"], caption=f"第{idx+1}张", use_column_width=True)
     else:
         pass
         #st.rerun()
 
+def iter_sse(resp):
+    # 解析服务端推送的SSE事件，产出 (event, data)
+    event, data_lines = "message", []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
 def reset_form():
     st.session_state["form_title"] = ""
     st.session_state["form_type"] = "知识库"
@@ -82,16 +108,34 @@ if page == "任务查询":
             status_filter = st.multiselect("状态", ["pending", "in_progress", "completed", "paused"])
         with col3:
             date_range = st.date_input("创建时间区间", [])
+        col4, col5, col6 = st.columns(3)
+        with col4:
+            tag_filter = st.text_input("标签")
+        with col5:
+            page_size = st.selectbox("每页条数", [20, 50, 100, 200], index=1)
+        with col6:
+            page_no = st.number_input("页码", min_value=1, value=1, step=1)
         submit = st.form_submit_button("查询")
-    r = requests.get(f"{API_URL}/tasks/")
+    # 筛选和分页由后端完成，只取当前页
+    params = {"skip": (page_no - 1) * page_size, "limit": page_size, "view": "summary"}
+    if search:
+        params["q"] = search
+    if status_filter:
+        params["status"] = status_filter
+    if tag_filter.strip():
+        params["tag"] = tag_filter.strip()
+    if date_range and len(date_range) == 2:
+        params["created_from"], params["created_to"] = str(date_range[0]), str(date_range[1])
+    r = api.get("/tasks/search", params=params)
     if r.status_code == 200:
-        tasks = r.json()
+        result = r.json()
+        tasks = result["items"]
+        st.caption(f"共 {result['total']} 条任务")
         if tasks:
             df = pd.DataFrame([{
                 "ID": t["id"],
                 "名称": t["title"],
                 "类型": "知识库" if t["type"] == "knowledge" else "工作记录",
-                "描述": t["description"],
                 "状态": t["status"],
                 "优先级": t["priority"],
                 "标签": t["tags"],
@@ -100,14 +144,6 @@ if page == "任务查询":
                 "完成时间": t["completed_at"][:19].replace('T', ' ') if t["completed_at"] else "" if t["type"] == "work" else "",
                 "操作": ""
             } for t in tasks])
-            if submit:
-                if search:
-                    df = df[df[["名称", "描述", "标签"]].apply(lambda x: x.str.contains(search, na=False), axis=1).any(axis=1)]
-                if status_filter:
-                    df = df[df["状态"].isin(status_filter)]
-                if date_range and len(date_range) == 2:
-                    start, end = date_range
-                    df = df[(df["创建时间"] >= str(start)) & (df["创建时间"] <= str(end))]
             gb = GridOptionsBuilder.from_dataframe(df)
             gb.configure_pagination(paginationAutoPageSize=True)
             gb.configure_default_column(editable=False, groupable=True)
@@ -132,25 +168,30 @@ if page == "任务查询":
                 sel = selected[0]
                 task_id = sel['ID']
                 st.markdown(f"---\n**任务ID:** {sel['ID']}  **名称:** {sel['名称']}  **类型:** {sel['类型']}  **状态:** {sel['状态']}")
+                # 表格只取了精简字段，选中后再单独拉取描述和附件
+                r_detail = api.get(f"/tasks/{task_id}")
+                task = r_detail.json() if r_detail.status_code == 200 else None
+                if task and task["description"]:
+                    st.markdown(task["description"])
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     if sel['状态'] != 'completed' and st.button(f"标记完成_{task_id}"):
                         update = {"status": "completed"}
-                        requests.put(f"{API_URL}/tasks/{task_id}", json=update)
+                        api.put(f"/tasks/{task_id}", json=update)
                         st.rerun()
                 with col2:
                     if sel['状态'] != 'in_progress' and st.button(f"设为进行中_{task_id}"):
                         update = {"status": "in_progress"}
-                        requests.put(f"{API_URL}/tasks/{task_id}", json=update)
+                        api.put(f"/tasks/{task_id}", json=update)
                         st.rerun()
                 with col3:
                     if sel['状态'] != 'paused' and st.button(f"设为暂停_{task_id}"):
                         update = {"status": "paused"}
-                        requests.put(f"{API_URL}/tasks/{task_id}", json=update)
+                        api.put(f"/tasks/{task_id}", json=update)
                         st.rerun()
                 with col4:
                     if st.button(f"删除_{task_id}"):
-                        requests.delete(f"{API_URL}/tasks/{task_id}")
+                        api.delete(f"/tasks/{task_id}")
                         st.rerun()
                 # 附件上传与管理
                 st.write("附件：")
@@ -168,11 +209,17 @@ if page == "任务查询":
                 handle_paste_image()
                 display_pasted_images()
                 # 展示附件及删除按钮
-                task = next((t for t in tasks if t['id'] == task_id), None)
                 if task and task['attachments']:
                     for att in task['attachments']:
                         download_url = f"{API_URL}/attachments/{att['id']}/download"
                         st.write(f"{att['filename']} ({att['filetype']}) [下载附件]({download_url})")
+                        # 图片只加载缩略图，原图走下载链接
+                        if (att['filetype'] or "").startswith("image"):
+                            thumb = api.get(f"/attachments/{att['id']}/thumbnail", params={"size": 512})
+                            if thumb.status_code == 200:
+                                st.image(thumb.content, width=256)
+                            else:
+                                st.caption("缩略图生成中…")
                         del_btn_key = f"del_btn_{att['id']}_{task_id}"
                         confirm_key = f"confirm_del_{att['id']}_{task_id}"
                         if st.button("删除", key=del_btn_key):
@@ -182,7 +229,7 @@ if page == "任务查询":
                             col1, col2 = st.columns(2)
                             with col1:
                                 if st.button("确定删除", key=f"yes_{att['id']}_{task_id}"):
-                                    res = requests.delete(f"{API_URL}/attachments/{att['id']}")
+                                    res = api.delete(f"/attachments/{att['id']}")
                                     if res.status_code == 200:
                                         st.toast("附件删除成功！", icon="✅")
                                         st.session_state[confirm_key] = False
@@ -208,16 +255,28 @@ elif page == "AI任务会话":
     user_input = st.text_input("请输入你的需求或目标：", key="ai_chat_input")
     if st.button("发送", key="ai_chat_send"):
         if user_input.strip():
+            # 流式接收：每拆出一个任务就立即显示
+            ai_tasks, error = [], None
             with st.spinner("AI正在思考..."):
-                resp = requests.post(f"{API_URL}/ai_generate_tasks/", json={"prompt": user_input})
-            if resp.status_code == 200:
-                ai_tasks = resp.json()["tasks"]
+                resp = api.stream_post("/ai_generate_tasks/stream", json={"prompt": user_input})
+                if resp.status_code == 200:
+                    for event, data in iter_sse(resp):
+                        if event == "task":
+                            ai_tasks.append(data)
+                            st.markdown(f"<div style='background:#fffbe6;padding:4px 12px;border-radius:6px;margin-bottom:2px;'>- <b>{data['title']}</b>: {data['description']}</div>", unsafe_allow_html=True)
+                        elif event == "error":
+                            error = data["detail"]
+                else:
+                    error = resp.text
+                # 流式拆分过程中已写入任务
+                api.invalidate()
+            if error is None:
                 st.session_state["chat_history"].append(("user", user_input))
                 st.session_state["chat_history"].append(("ai", ai_tasks))
                 st.session_state["last_ai_tasks"] = ai_tasks
                 st.rerun()
             else:
-                st.error(f"AI生成失败: {resp.text}")
+                st.error(f"AI生成失败: {error}")
     # 聊天历史区
     for role, content in st.session_state["chat_history"]:
         if role == "user":
@@ -229,19 +288,22 @@ elif page == "AI任务会话":
     # 任务统计区
     st.markdown("---")
     st.subheader("任务统计")
-    r = requests.get(f"{API_URL}/tasks/")
+    r = api.get("/tasks/stats")
     if r.status_code == 200:
-        tasks = r.json()
-        total = len(tasks)
-        completed = len([t for t in tasks if t['status'] == 'completed'])
-        pending = len([t for t in tasks if t['status'] == 'pending'])
-        in_progress = len([t for t in tasks if t['status'] == 'in_progress'])
-        paused = len([t for t in tasks if t['status'] == 'paused'])
+        stats = r.json()
+        by_status = stats["by_status"]
+        total = stats["total"]
+        completed = by_status.get("completed", 0)
+        pending = by_status.get("pending", 0)
+        in_progress = by_status.get("in_progress", 0)
+        paused = by_status.get("paused", 0)
         st.write(f"**总任务数：** {total}")
         st.write(f"**已完成：** {completed}")
         st.write(f"**未完成：** {pending}")
         st.write(f"**进行中：** {in_progress}")
         st.write(f"**已暂停：** {paused}")
+        if stats["completed_per_day"]:
+            st.bar_chart(pd.Series(stats["completed_per_day"], name="每日完成数"))
     else:
         st.error("无法获取任务统计信息")
 
@@ -251,12 +313,23 @@ elif page == "AI任务会话":
     analysis_input = st.text_area("请输入你的数据分析需求：", key="ai_analysis_input")
     if st.button("提交分析", key="ai_analysis_btn"):
         if analysis_input.strip():
-            with st.spinner("AI正在分析..."):
-                resp = requests.post(f"{API_URL}/ai_data_analysis/", json={"prompt": analysis_input})
+            resp = api.stream_post("/ai_data_analysis/stream", json={"prompt": analysis_input})
             if resp.status_code == 200:
-                result = resp.json()["result"]
                 st.success("分析结果：")
-                st.markdown(result)
+                placeholder = st.empty()
+                result = ""
+                for event, data in iter_sse(resp):
+                    if event == "error":
+                        st.error(f"AI分析失败: {data['detail']}")
+                        break
+                    if event == "message":
+                        result += data["delta"]
+                        placeholder.markdown(result + "▌")
+                    elif event == "done":
+                        tokens = data["tokens"]
+                        st.caption(f"参考任务 {tokens['tasks']} 条、附件片段 {tokens['snippets']} 段；"
+                                   f"约 {tokens['total_tokens']} tokens（输入 {tokens['prompt_tokens']}，输出 {tokens['completion_tokens']}）")
+                placeholder.markdown(result)
             else:
                 st.error(f"AI分析失败: {resp.text}")
 
@@ -309,36 +382,32 @@ elif page == "添加任务":
         }
         if type_ == "工作记录" and completed_at:
             data["completed_at"] = str(completed_at)
-        r_add = requests.post(f"{API_URL}/tasks/", json=data)
+        r_add = api.post("/tasks/", json=data)
         if r_add.status_code == 200:
             task_id = r_add.json()["id"]
             all_success = True
-            # 上传file_uploader选中的文件
+            # file_uploader选中的文件和所有粘贴图片合并为一次批量上传
+            files = []
             if uploaded_files:
                 for uploaded_file in uploaded_files:
                     if uploaded_file.type.startswith("image"):
                         st.image(uploaded_file, caption=uploaded_file.name, width=150)
                     else:
                         st.write(f"已选择文件：{uploaded_file.name}")
-                    files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-                    res = requests.post(f"{API_URL}/tasks/{task_id}/attachments/", files=files)
-                    if res.status_code == 200:
-                        st.toast(f"附件 {uploaded_file.name} 上传成功！", icon="✅")
-                    else:
-                        st.toast(f"附件 {uploaded_file.name} 上传失败", icon="❌")
-                        all_success = False
-            # 上传所有粘贴图片
-            #st.write("图片长度：", len(session_state.get("pasted_images", [])))
+                    files.append(("files", (uploaded_file.name, uploaded_file, uploaded_file.type)))
             for idx, img_data in enumerate(st.session_state.get("pasted_images", [])):
-                buf = BytesIO()
-                img_data["image"].save(buf, format="PNG")
-                buf.seek(0)
-                files = {"file": (f"pasted_{idx+1}.png", buf, "image/png")}
-                res = requests.post(f"{API_URL}/tasks/{task_id}/attachments/", files=files)
+                files.append(("files", (f"pasted_{idx+1}.png", BytesIO(img_data["png"]), "image/png")))
+            if files:
+                res = api.post(f"/tasks/{task_id}/attachments/batch", files=files)
                 if res.status_code == 200:
-                    st.toast(f"粘贴图片{idx+1}上传成功！", icon="✅")
+                    for item in res.json():
+                        if item["ok"]:
+                            st.toast(f"附件 {item['filename']} 上传成功！", icon="✅")
+                        else:
+                            st.toast(f"附件 {item['filename']} 上传失败: {item['error']}", icon="❌")
+                            all_success = False
                 else:
-                    st.toast(f"粘贴图片{idx+1}上传失败", icon="❌")
+                    st.toast("附件上传失败", icon="❌")
                     all_success = False
             st.success("任务添加成功！")
             st.session_state.clear()
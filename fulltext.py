@@ -0,0 +1,214 @@
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+from models import Task, SearchPosting, SearchStat, AttachmentText
+
+# 全文检索：中文按字/二元组切分，英文数字按词切分，倒排表存在数据库中，BM25排序。
+# 每个倒排项存好词频分量 impact（按建索引时的平均文档长度算），得分 = Σ idf × impact；
+# 查询时各词项按 impact 从高往低分块读取，前 k 名的得分已不可能被未读部分超过时提前结束（阈值算法），
+# 延迟取决于 k 和词项分布，而不是倒排链总长。
+
+K1 = 1.2
+B = 0.75
+TITLE_BOOST = 2  # 标题中的词项按两倍词频计
+MAX_TERM_LENGTH = 64
+SCAN_CHUNK = 64  # 每个词项首轮读取的倒排项数，之后每轮翻倍
+MAX_SCAN_PER_TERM = 2048  # 每个词项最多读取的倒排项数：得分分布很平的高频词读到上限即停，结果近似
+DF_CACHE_TTL = 300  # 文档频率缓存秒数，idf 对少量增删不敏感
+DF_CACHE_SIZE = 10000
+
+_CJK = r"㐀-䶿一-鿿豈-﫿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[a-z0-9]+")
+
+def tokenize(text: str, for_query: bool = False):
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if run[0].isascii():
+            tokens.append(run[:MAX_TERM_LENGTH])
+            continue
+        # 中文连续片段：单字 + 相邻二元组；查询时只用二元组，避免高频单字拉出超长倒排链
+        if not for_query or len(run) == 1:
+            tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def task_terms(task: Task):
+    counts = Counter()
+    for _ in range(TITLE_BOOST):
+        counts.update(tokenize(task.title))
+    counts.update(tokenize(task.description))
+    counts.update(tokenize((task.tags or "").replace(",", " ")))
+    return counts
+
+def attachment_terms(db: Session, task_id: int):
+    # 附件抽取出的文本并入所属任务的词项
+    counts = Counter()
+    for text, in db.query(AttachmentText.text).filter(AttachmentText.task_id == task_id, AttachmentText.text.isnot(None)):
+        counts.update(tokenize(text))
+    return counts
+
+def _update_stats(db: Session, doc_delta: int, length_delta: int):
+    updated = db.query(SearchStat).filter(SearchStat.id == 1).update({
+        SearchStat.doc_count: SearchStat.doc_count + doc_delta,
+        SearchStat.total_length: SearchStat.total_length + length_delta,
+    }, synchronize_session=False)
+    if not updated:
+        db.add(SearchStat(id=1, doc_count=doc_delta, total_length=length_delta))
+        db.flush()
+
+def remove_task(db: Session, task_id: int):
+    old = db.query(SearchPosting.doc_len).filter(SearchPosting.task_id == task_id).first()
+    if old is None:
+        return
+    db.query(SearchPosting).filter(SearchPosting.task_id == task_id).delete(synchronize_session=False)
+    _update_stats(db, -1, -old.doc_len)
+
+def _avgdl(db: Session, docs: int, length: int) -> float:
+    # 含本次新增文档在内的平均文档长度
+    stats = db.query(SearchStat).filter(SearchStat.id == 1).first()
+    if stats is not None:
+        docs += stats.doc_count
+        length += stats.total_length
+    return length / docs if docs > 0 else 1.0
+
+def impact(tf: int, doc_len: int, avgdl: float) -> float:
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_len / avgdl))
+
+def _postings(task_id: int, counts: Counter, avgdl: float):
+    doc_len = sum(counts.values())
+    return [
+        {"term": term, "task_id": task_id, "tf": tf, "doc_len": doc_len, "impact": impact(tf, doc_len, avgdl)}
+        for term, tf in counts.items()
+    ]
+
+def index_task(db: Session, task: Task):
+    """
+    重建单个任务的倒排项，需在调用方事务内执行（任务须已flush拿到id）。
+    """
+    remove_task(db, task.id)
+    counts = task_terms(task) + attachment_terms(db, task.id)
+    if not counts:
+        return
+    doc_len = sum(counts.values())
+    db.bulk_insert_mappings(SearchPosting, _postings(task.id, counts, _avgdl(db, 1, doc_len)))
+    _update_stats(db, 1, doc_len)
+
+def index_new_tasks(db: Session, tasks: list):
+    """
+    批量索引新建任务：一次性插入全部倒排项并只更新一次全局统计。
+    """
+    documents = [(task.id, counts) for task, counts in ((t, task_terms(t)) for t in tasks) if counts]
+    if not documents:
+        return
+    docs, total_length = len(documents), sum(sum(counts.values()) for _, counts in documents)
+    avgdl = _avgdl(db, docs, total_length)
+    db.bulk_insert_mappings(SearchPosting, [m for task_id, counts in documents for m in _postings(task_id, counts, avgdl)])
+    _update_stats(db, docs, total_length)
+
+def rebuild(db: Session, batch_size: int = 500):
+    db.query(SearchPosting).delete(synchronize_session=False)
+    db.query(SearchStat).delete(synchronize_session=False)
+    last_id = 0
+    while True:
+        batch = db.query(Task).filter(Task.id > last_id).order_by(Task.id).limit(batch_size).all()
+        if not batch:
+            break
+        for task in batch:
+            index_task(db, task)
+        last_id = batch[-1].id
+        db.commit()
+    db.commit()
+
+_df_cache = OrderedDict()  # term -> (写入时间, 文档频率)
+_df_lock = threading.Lock()
+
+def _document_frequencies(db: Session, terms) -> dict:
+    now = time.monotonic()
+    result, missing = {}, []
+    with _df_lock:
+        for term in terms:
+            cached = _df_cache.get(term)
+            if cached and now - cached[0] < DF_CACHE_TTL:
+                result[term] = cached[1]
+            else:
+                missing.append(term)
+    if missing:
+        counted = dict(
+            db.query(SearchPosting.term, func.count(SearchPosting.task_id))
+            .filter(SearchPosting.term.in_(missing)).group_by(SearchPosting.term)
+        )
+        with _df_lock:
+            for term in missing:
+                result[term] = counted.get(term, 0)
+                _df_cache[term] = (now, result[term])
+                _df_cache.move_to_end(term)
+            while len(_df_cache) > DF_CACHE_SIZE:
+                _df_cache.popitem(last=False)
+    return result
+
+def search(db: Session, query: str, limit: int = 20):
+    """
+    返回按BM25得分降序的[(task_id, score)]。
+    每轮为每个词项按 impact 降序再读一块，新见到的任务一次性补齐其全部查询词的得分；
+    未见过的任务得分上限为各词项最后读到的 idf × impact 之和，第 limit 名已不低于该上限即可停止。
+    """
+    terms = set(tokenize(query, for_query=True))
+    if not terms:
+        return []
+    stats = db.query(SearchStat).filter(SearchStat.id == 1).first()
+    if stats is None or stats.doc_count <= 0:
+        return []
+    n_docs = stats.doc_count
+    df = _document_frequencies(db, terms)
+    idf = {term: math.log(1 + (n_docs - n + 0.5) / (n + 0.5)) for term, n in df.items() if n > 0}
+    cursors = {term: None for term in idf}  # term -> 最后读到的 (impact, task_id)，读完后移除
+    bounds = {term: math.inf for term in idf}
+    scores = {}
+    chunk = max(SCAN_CHUNK, limit)
+    scanned = 0
+    while cursors:
+        new_ids = set()
+        for term in list(cursors):
+            statement = select(SearchPosting.impact, SearchPosting.task_id).where(SearchPosting.term == term)
+            last = cursors[term]
+            if last is not None:
+                # 行值比较，数据库可直接在 (term, impact, task_id) 索引上续读
+                statement = statement.where(tuple_(SearchPosting.impact, SearchPosting.task_id) < tuple_(*last))
+            statement = statement.order_by(SearchPosting.impact.desc(), SearchPosting.task_id.desc()).limit(chunk)
+            rows = db.execute(statement).all()
+            new_ids.update(task_id for _, task_id in rows if task_id not in scores)
+            if len(rows) < chunk:
+                del cursors[term]
+                bounds[term] = 0.0
+            else:
+                cursors[term] = tuple(rows[-1])
+                bounds[term] = rows[-1][0]
+        if new_ids:
+            # 随机访问补齐新任务在所有查询词上的得分
+            for ids in _batches(list(new_ids), 500):
+                for term, task_id, value in db.execute(
+                    select(SearchPosting.term, SearchPosting.task_id, SearchPosting.impact)
+                    .where(SearchPosting.term.in_(list(idf)), SearchPosting.task_id.in_(ids))
+                ):
+                    scores[task_id] = scores.get(task_id, 0.0) + idf[term] * value
+        threshold = sum(idf[term] * bounds[term] for term in idf)
+        if len(scores) >= limit and heapq.nlargest(limit, scores.values())[-1] >= threshold:
+            break
+        scanned += chunk
+        chunk = min(chunk * 2, MAX_SCAN_PER_TERM - scanned)
+        if chunk <= 0:
+            break
+    return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+def _batches(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
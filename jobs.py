@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import json
+import logging
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+from models import AIJob
+from llm_client import LLMError
+import config
+import database
+
+logger = logging.getLogger(__name__)
+
+# AI任务队列：耗时的大模型调用落库排队，立即返回任务id，由固定数量的后台协程领取执行，
+# 通过 /jobs/{id} 查询状态和结果。队列表即持久化存储，进程重启后未完成的任务会被重新领取。
+# 队列与任务处理使用独立的小连接池，worker 数量再多也不会挤占接口的数据库连接。
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+CLAIM_CANDIDATES = 5  # 每次领取时尝试的候选数，抢不到（被其他worker领走）就试下一个
+
+_engine = database.make_async_engine(
+    config.DATABASE_URL, pool_size=config.AI_JOB_DB_POOL_SIZE, max_overflow=config.AI_JOB_DB_POOL_SIZE,
+)
+JobSessionLocal = async_sessionmaker(bind=_engine, autoflush=False, expire_on_commit=False)
+
+_handlers = {}
+_workers = []
+_wakeup = None
+
+def handler(kind: str):
+    """
+    注册任务处理函数：async def fn(db, payload) -> 可JSON序列化的结果；db 为队列连接池的会话。
+    """
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+# 队列表读写（同步，经 run_sync 调用）
+
+def _enqueue(db: Session, kind: str, payload: dict, max_attempts: int):
+    job = AIJob(kind=kind, status=QUEUED, payload=json.dumps(payload, ensure_ascii=False),
+                attempts=0, max_attempts=max_attempts, run_after=_utcnow())
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def _claimable(now):
+    # 到期的排队任务，或执行者租约已过期（进程崩溃/重启）的运行中任务
+    return or_(
+        and_(AIJob.status == QUEUED, AIJob.run_after <= now),
+        and_(AIJob.status == RUNNING, AIJob.locked_until < now),
+    )
+
+def _claim(db: Session):
+    """
+    乐观领取：条件更新只有一个worker能成功（影响行数为1），多进程部署同样适用。
+    """
+    now = _utcnow()
+    candidates = [
+        job_id for job_id, in
+        db.query(AIJob.id).filter(_claimable(now)).order_by(AIJob.id).limit(CLAIM_CANDIDATES)
+    ]
+    for job_id in candidates:
+        claimed = db.query(AIJob).filter(AIJob.id == job_id, _claimable(now)).update({
+            AIJob.status: RUNNING,
+            AIJob.attempts: AIJob.attempts + 1,
+            AIJob.started_at: now,
+            # 租约比超时稍长，正常执行的任务不会被重复领取
+            AIJob.locked_until: now + datetime.timedelta(seconds=config.AI_JOB_TIMEOUT + 30),
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.query(AIJob).filter(AIJob.id == job_id).first()
+    return None
+
+def _finish(db: Session, job_id: int, result):
+    db.query(AIJob).filter(AIJob.id == job_id).update({
+        AIJob.status: SUCCEEDED,
+        AIJob.result: json.dumps(result, ensure_ascii=False, default=str),
+        AIJob.error: None,
+        AIJob.finished_at: _utcnow(),
+        AIJob.locked_until: None,
+    }, synchronize_session=False)
+    db.commit()
+
+def _fail(db: Session, job_id: int, error: str, retry_after: float = None):
+    # retry_after 为 None 时记为最终失败，否则重新排队等待重试
+    values = {AIJob.error: error[:500], AIJob.locked_until: None}
+    if retry_after is None:
+        values.update({AIJob.status: FAILED, AIJob.finished_at: _utcnow()})
+    else:
+        values.update({AIJob.status: QUEUED, AIJob.run_after: _utcnow() + datetime.timedelta(seconds=retry_after)})
+    db.query(AIJob).filter(AIJob.id == job_id).update(values, synchronize_session=False)
+    db.commit()
+
+def _get(db: Session, job_id: int):
+    return db.query(AIJob).filter(AIJob.id == job_id).first()
+
+async def _store(fn, *args):
+    async with JobSessionLocal() as db:
+        return await db.run_sync(lambda s: fn(s, *args))
+
+# 对外接口
+
+async def enqueue(kind: str, payload: dict, max_attempts: int = None):
+    if kind not in _handlers:
+        raise ValueError(f"未注册的任务类型: {kind}")
+    job = await _store(_enqueue, kind, payload, max_attempts or config.AI_JOB_MAX_ATTEMPTS)
+    if _wakeup is not None:
+        _wakeup.set()
+    return job
+
+async def get_job(job_id: int):
+    return await _store(_get, job_id)
+
+def _retryable(e: Exception) -> bool:
+    # 只重试超时和暂时性的大模型错误；参数错误、模型输出解析失败等重试也不会成功，直接记为失败
+    return isinstance(e, asyncio.TimeoutError) or (isinstance(e, LLMError) and e.transient)
+
+async def _run(job):
+    payload = json.loads(job.payload)
+    if job.attempts > 1:
+        # 重试时跳过响应缓存，不复用上次可能有问题的结果
+        payload["no_cache"] = True
+    try:
+        async with JobSessionLocal() as db:
+            result = await asyncio.wait_for(_handlers[job.kind](db, payload), config.AI_JOB_TIMEOUT)
+    except asyncio.CancelledError:
+        # 进程退出时放回队列，下次启动立即重新执行
+        await asyncio.shield(_store(_fail, job.id, "进程退出时中断", 0))
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            error = f"超过 {config.AI_JOB_TIMEOUT:g} 秒未完成"
+        else:
+            error = f"{type(e).__name__}: {e}"
+        retry_after = None
+        if job.attempts < job.max_attempts and _retryable(e):
+            retry_after = config.AI_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        logger.warning("AI任务 %s 第%s次执行失败: %s", job.id, job.attempts, error)
+        await _store(_fail, job.id, error, retry_after)
+    else:
+        await _store(_finish, job.id, result)
+
+async def _work():
+    while True:
+        # 先清标志再领取：领取期间新入队的任务不会错过唤醒
+        _wakeup.clear()
+        try:
+            job = await _store(_claim)
+        except Exception:
+            logger.exception("领取AI任务失败")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), config.AI_JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        if job.kind not in _handlers:
+            await _store(_fail, job.id, f"未注册的任务类型: {job.kind}")
+            continue
+        await _run(job)
+
+def start():
+    global _wakeup
+    if _workers:
+        return
+    _wakeup = asyncio.Event()
+    for i in range(config.AI_JOB_WORKERS):
+        _workers.append(asyncio.create_task(_work(), name=f"ai-job-{i}"))
+
+async def stop():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    await _engine.dispose()
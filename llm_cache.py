@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 大模型响应缓存：内存LRU（条数+TTL）+ 可选SQLite持久层，相同请求并发时只发一次上游调用
+
+_WHITESPACE_RE = re.compile(r"\s+")
+PURGE_INTERVAL = 600  # SQLite 持久层清理过期行的最小间隔（秒）
+
+def normalize_prompt(prompt: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", prompt)).strip()
+
+def make_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    raw = json.dumps([model, system_prompt, normalize_prompt(user_prompt)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class MemoryTier:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expires_at: float = None):
+        with self._lock:
+            self._data[key] = (expires_at or time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteTier:
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_expires_at ON llm_cache (expires_at)")
+        self._conn.commit()
+        self._next_purge = 0.0
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] < time.time():
+                # 读到过期行顺手删掉
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ? AND expires_at < ?", (key, time.time()))
+                self._conn.commit()
+                return None
+        return row
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                               (key, value, now + self.ttl))
+            # 从未再被读到的过期行靠写入时定期清理，文件不会无限增长
+            if now >= self._next_purge:
+                self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+                self._next_purge = now + PURGE_INTERVAL
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+class LLMCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, sqlite_path: str = None):
+        self.memory = MemoryTier(max_entries, ttl)
+        self.disk = SQLiteTier(sqlite_path, ttl) if sqlite_path else None
+        self._inflight = {}
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "invalid": 0}
+
+    async def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+        if self.disk is not None:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None:
+                value, expires_at = row
+                self.memory.set(key, value, expires_at)
+                self.stats["disk_hits"] += 1
+                return value
+        return None
+
+    async def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    async def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.delete, key)
+
+    async def get_valid(self, key: str, validate=None):
+        """
+        读取缓存；validate 校验不通过（抛异常）的旧结果删除并按未命中处理。
+        """
+        value = await self.get(key)
+        if value is None or validate is None:
+            return value
+        try:
+            validate(value)
+        except Exception:
+            self.stats["invalid"] += 1
+            await self.delete(key)
+            return None
+        return value
+
+    async def get_or_compute(self, key: str, compute, bypass: bool = False, validate=None) -> str:
+        """
+        compute 为无参协程函数。bypass 时跳过读取但仍写回最新结果。
+        validate(value) 抛异常表示结果不可用（如JSON解析失败），该结果不写入缓存，异常原样抛给调用方。
+        """
+        if bypass:
+            self.stats["bypassed"] += 1
+        else:
+            value = await self.get_valid(key, validate)
+            if value is not None:
+                return value
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+        if not bypass:
+            self.stats["misses"] += 1
+        # 上游调用放在独立的 task 里，每个调用方（包括发起者）都隔着 shield 等待：
+        # 发起者被取消（如客户端断开）时计算继续进行，其他仍在等待的请求照常拿到结果
+        task = asyncio.ensure_future(self._compute(key, compute, validate))
+        self._inflight[key] = task
+
+        def done(t):
+            if self._inflight.get(key) is t:
+                del self._inflight[key]
+            # 所有调用方都已离开时也取走异常，避免 "exception was never retrieved" 警告
+            if not t.cancelled():
+                t.exception()
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, compute, validate) -> str:
+        value = await compute()
+        if validate is not None:
+            validate(value)
+        await self.set(key, value)
+        return value
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.memory),
+            "hit_rate": (self.stats["hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import random
+import time
+import httpx
+import config
+import metrics
+from llm_cache import LLMCache, make_key
+
+# 共享的异步大模型客户端：长连接池 + 并发上限 + 指数退避重试
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    # transient=True 表示网络错误或限流/服务端错误，稍后重试可能成功；配置错误、4xx、响应格式异常重试无益
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
+
+class LLMClient:
+    def __init__(
+        self,
+        api_url: str = config.DEEPSEEK_API_URL,
+        api_key: str = config.DEEPSEEK_API_KEY,
+        model: str = config.DEEPSEEK_MODEL,
+        timeout: float = config.LLM_TIMEOUT,
+        max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+        max_connections: int = config.LLM_MAX_CONNECTIONS,
+        max_retries: int = config.LLM_MAX_RETRIES,
+        retry_backoff: float = config.LLM_RETRY_BACKOFF,
+        transport: httpx.AsyncBaseTransport = None,
+        cache: LLMCache = None,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._transport = transport
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            if not self.api_key:
+                raise LLMError("未配置大模型 API Key，请设置环境变量 DEEPSEEK_API_KEY")
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+                transport=self._transport,
+            )
+        return self._client
+
+    def _payload(self, system_prompt: str, user_prompt: str, **params):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            **params,
+        }
+
+    def _backoff(self, attempt: int, response: httpx.Response = None) -> float:
+        # 服务端给的 Retry-After 可能很长，最多等一个请求超时，不让调用方无限挂起
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.timeout)
+        return min(self.retry_backoff * (2 ** attempt) * (1 + random.random() * 0.25), self.timeout)
+
+    async def _post(self, payload: dict) -> dict:
+        # 并发名额只在请求进行时占用，退避等待期间释放给其他请求
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                async with self._semaphore:
+                    resp = await client.post(self.api_url, json=payload)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise LLMError(f"请求失败: {e}", transient=True) from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            if resp.status_code in RETRY_STATUS_CODES and not last_attempt:
+                await asyncio.sleep(self._backoff(attempt, resp))
+                continue
+            if resp.status_code >= 400:
+                raise LLMError(f"HTTP {resp.status_code}: {resp.text[:200]}", transient=resp.status_code in RETRY_STATUS_CODES)
+            return resp.json()
+
+    async def complete(self, system_prompt: str, user_prompt: str, **params) -> dict:
+        """
+        返回完整的响应JSON（含usage）。
+        """
+        start = time.perf_counter()
+        try:
+            data = await self._post(self._payload(system_prompt, user_prompt, **params))
+        except Exception:
+            metrics.observe_llm("chat", "error", time.perf_counter() - start)
+            raise
+        metrics.observe_llm("chat", "ok", time.perf_counter() - start, data.get("usage") if isinstance(data, dict) else None)
+        return data
+
+    async def _chat_uncached(self, system_prompt: str, user_prompt: str, **params) -> str:
+        data = await self.complete(system_prompt, user_prompt, **params)
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"响应格式异常: {data}") from e
+
+    async def chat(self, system_prompt: str, user_prompt: str, no_cache: bool = False, validate=None, **params) -> str:
+        """
+        validate(content) 抛异常表示输出不可用（如要求JSON但解析失败），这样的输出不会进缓存。
+        """
+        # 带额外采样参数的请求不走缓存，避免不同参数命中同一条结果
+        if self.cache is None or params:
+            return await self._chat_uncached(system_prompt, user_prompt, **params)
+        key = make_key(self.model, system_prompt, user_prompt)
+        return await self.cache.get_or_compute(
+            key, lambda: self._chat_uncached(system_prompt, user_prompt), bypass=no_cache, validate=validate
+        )
+
+    async def stream_chat(self, system_prompt: str, user_prompt: str, no_cache: bool = False, validate=None, **params):
+        """
+        以 stream=True 调用，逐段产出增量文本。命中缓存时一次性产出全文；完整收完且通过 validate 后写回缓存。
+        """
+        key = None
+        if self.cache is not None and not params:
+            key = make_key(self.model, system_prompt, user_prompt)
+            cached = None if no_cache else await self.cache.get_valid(key, validate)
+            if cached is not None:
+                yield cached
+                return
+            self.cache.stats["bypassed" if no_cache else "misses"] += 1
+        parts = []
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async for delta in self._stream_uncached(system_prompt, user_prompt, **params):
+                if not parts:
+                    metrics.LLM_FIRST_TOKEN.observe(time.perf_counter() - start)
+                parts.append(delta)
+                yield delta
+            outcome = "ok"
+        except GeneratorExit:
+            # 客户端中途断开，耗时只算到断开为止
+            outcome = "cancelled"
+            raise
+        finally:
+            metrics.observe_llm("stream", outcome, time.perf_counter() - start)
+        if key is not None:
+            content = "".join(parts)
+            try:
+                if validate is not None:
+                    validate(content)
+            except Exception:
+                self.cache.stats["invalid"] += 1
+                return
+            await self.cache.set(key, content)
+
+    async def _stream_uncached(self, system_prompt: str, user_prompt: str, **params):
+        # 只在收到首段内容前重试；并发名额在退避等待期间释放
+        payload = self._payload(system_prompt, user_prompt, stream=True, **params)
+        client = self._get_client()
+        received = False
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                async with self._semaphore, client.stream("POST", self.api_url, json=payload) as resp:
+                    if resp.status_code in RETRY_STATUS_CODES and not last_attempt:
+                        delay = self._backoff(attempt, resp)
+                    else:
+                        if resp.status_code >= 400:
+                            await resp.aread()
+                            raise LLMError(f"HTTP {resp.status_code}: {resp.text[:200]}",
+                                           transient=resp.status_code in RETRY_STATUS_CODES)
+                        async for line in resp.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            try:
+                                event = json.loads(data)
+                                # 开启 include_usage 时最后一段只有 usage，choices 为空
+                                if event.get("usage"):
+                                    metrics.count_tokens(event["usage"])
+                                if not event.get("choices") and "usage" in event:
+                                    continue
+                                delta = event["choices"][0].get("delta", {}).get("content")
+                            except (ValueError, KeyError, IndexError, AttributeError) as e:
+                                raise LLMError(f"流式响应格式异常: {data[:200]}") from e
+                            if delta:
+                                received = True
+                                yield delta
+                        return
+            except httpx.TransportError as e:
+                # 已经产出过内容时重试会重复输出，直接报错
+                if last_attempt or received:
+                    raise LLMError(f"请求失败: {e}", transient=True) from e
+                delay = self._backoff(attempt)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+_default_client = None
+
+def get_client() -> LLMClient:
+    global _default_client
+    if _default_client is None:
+        cache = None
+        if config.LLM_CACHE_ENABLED:
+            cache = LLMCache(config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_TTL, config.LLM_CACHE_SQLITE_PATH or None)
+        _default_client = LLMClient(cache=cache)
+    return _default_client
+
+async def close_client():
+    if _default_client is not None:
+        await _default_client.aclose()
@@ -1,162 +1,471 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Body
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from models import Base, Attachment, Task
-from schemas import TaskCreate, TaskUpdate, TaskOut
-import crud
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Body, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Base
+from schemas import (
+    TaskCreate, TaskUpdate, TaskOut, TaskPage, TaskHit, TaskCursorPage,
+    TaskSummaryOut, TaskSummaryPage, TaskSummaryCursorPage, TaskStats, TaskBulkResult,
+    AttachmentUploadResult, TagCount, TaskChanges, JobOut,
+)
+from typing import List, Optional, Union
+import async_crud
+from database import engine, get_async_db, get_async_read_db
+import migrations
+import datetime
 import os
-from fastapi.responses import FileResponse
-import requests
-from streamlit_paste_button import paste_image_button
-from io import BytesIO
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import json
+import logging
+import llm_client
+import config
+import storage
+import previews
+import semantic
+import extraction
+import jobs
+import metrics
+from upload_limit import UploadLimitMiddleware
+from file_responses import file_response
+from ai_stream import sse_event, SSE_HEADERS, JsonArrayParser
+from analysis_context import estimate_tokens
 
-# TiDB数据库连接配置
-SQLALCHEMY_DATABASE_URL = "mysql+pymysql://root:@192.168.5.124:4000/myassistant"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
 
 # 创建表（如未创建）
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app = FastAPI()
+# 上传大小在解析表单前检查；指标中间件在最外层，被拒绝的上传同样计入
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
-# 依赖项：获取数据库会话
+# AI生成任务接口
+TASK_SPLIT_SYSTEM_PROMPT = "你是一个任务拆解助手，请将用户输入的目标拆解为简明的任务列表，返回JSON数组，每个任务包含title和description。"
+DATA_ANALYSIS_SYSTEM_PROMPT = (
+    "你是一个数据分析助手，请根据用户问题和随附的任务数据（统计汇总、相关任务表、附件片段，字段以|分隔）进行分析，"
+    "返回简明结论；数据不足以回答时直接说明。"
+)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.on_event("startup")
+async def start_jobs():
+    jobs.start()
+    semantic.start()
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await jobs.stop()
+    await llm_client.close_client()
+    previews.shutdown()
+    extraction.shutdown()
+
+def parse_ai_tasks(content: str) -> list:
+    # 模型应返回JSON数组；解析失败的输出不进缓存，下次请求重新生成
+    tasks = json.loads(content)
+    if not isinstance(tasks, list):
+        raise ValueError("AI返回的不是任务数组")
+    return tasks
+
+def ai_task_creates(tasks: list):
+    return [TaskCreate(title=t.get("title", "AI任务"), description=t.get("description", "")) for t in tasks]
+
+def job_accepted(job):
+    return JSONResponse(
+        {"job_id": job.id, "status": job.status}, status_code=202, headers={"Location": f"/jobs/{job.id}"},
+    )
+
+@jobs.handler("generate_tasks")
+async def generate_tasks(db: AsyncSession, payload: dict):
+    """
+    调用DeepSeek API把一句话拆解为多个任务并写入数据库；同步接口和任务队列共用。
+    """
+    # 1. 调用DeepSeek API（地址、Key、模型见 config.py）
+    ai_content = await llm_client.get_client().chat(
+        TASK_SPLIT_SYSTEM_PROMPT, payload["prompt"], no_cache=payload.get("no_cache", False), validate=parse_ai_tasks,
+    )
+    tasks = parse_ai_tasks(ai_content)
+    # 2. 写入数据库
+    task_creates = ai_task_creates(tasks)
+    ids = await async_crud.create_tasks_bulk(task_creates)
+    return {"tasks": [ {"id": task_id, "title": t.title, "description": t.description} for task_id, t in zip(ids, task_creates) ]}
 
-# AI生成任务接口
 @app.post("/ai_generate_tasks/")
-def ai_generate_tasks(prompt: str = Body(..., embed=True), db: Session = Depends(get_db)):
+async def ai_generate_tasks(prompt: str = Body(..., embed=True), no_cache: bool = Body(False), job: bool = Body(False), db: AsyncSession = Depends(get_async_db)):
     """
     输入一句话，调用DeepSeek API，AI自动拆解为多个任务并写入数据库。
+    job=true 时只入队并返回202和任务id，结果通过 GET /jobs/{id} 查询。
     """
-    # 1. 调用DeepSeek API（此处用占位符，需替换为你的API Key和真实接口）
-    DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
-    DEEPSEEK_API_KEY = "sk-a9890582d5d54c78b952f0805da434df"  # 请替换为你的Key
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    # 你可以根据DeepSeek的API格式调整messages内容
-    data = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": "你是一个任务拆解助手，请将用户输入的目标拆解为简明的任务列表，返回JSON数组，每个任务包含title和description。"},
-            {"role": "user", "content": prompt}
-        ]
-    }
+    payload = {"prompt": prompt, "no_cache": no_cache}
+    if job:
+        return job_accepted(await jobs.enqueue("generate_tasks", payload))
     try:
-        resp = requests.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=30)
-        resp.raise_for_status()
-        ai_content = resp.json()["choices"][0]["message"]["content"]
-        # 假设AI返回内容为JSON数组字符串
-        import json
-        tasks = json.loads(ai_content)
+        return await generate_tasks(db, payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI生成任务失败: {e}")
-    # 2. 写入数据库
-    created_tasks = []
-    for t in tasks:
-        task_obj = crud.create_task(db, TaskCreate(title=t.get("title", "AI任务"), description=t.get("description", "")))
-        created_tasks.append(task_obj)
-    return {"tasks": [ {"id": t.id, "title": t.title, "description": t.description} for t in created_tasks ]}
+
+@app.post("/ai_generate_tasks/stream")
+async def ai_generate_tasks_stream(prompt: str = Body(..., embed=True), no_cache: bool = Body(False)):
+    """
+    流式拆解任务：每解析出一个完整任务就写库并以SSE事件 task 推送，结束时推送 done。
+    """
+    async def events():
+        parser = JsonArrayParser()
+        created = 0
+        try:
+            async for delta in llm_client.get_client().stream_chat(TASK_SPLIT_SYSTEM_PROMPT, prompt, no_cache=no_cache, validate=parse_ai_tasks):
+                for t in parser.feed(delta):
+                    if not isinstance(t, dict):
+                        continue
+                    task_obj = await async_crud.create_task(ai_task_creates([t])[0])
+                    created += 1
+                    yield sse_event({"id": task_obj.id, "title": task_obj.title, "description": task_obj.description}, event="task")
+            yield sse_event({"count": created}, event="done")
+        except Exception as e:
+            yield sse_event({"detail": f"AI生成任务失败: {e}"}, event="error")
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def summary_response(schema, content):
+    # summary视图直接按精简模型序列化，避免 response_model 校验时回头读取未加载的 description/attachments
+    return JSONResponse(jsonable_encoder(parse_obj_as(schema, content)))
+
+VIEW_PATTERN = "^(full|summary)$"
 
 # 任务API
 @app.post("/tasks/", response_model=TaskOut)
-def create_task(task: TaskCreate, db: Session = Depends(get_db)):
-    return crud.create_task(db, task)
+async def create_task(task: TaskCreate):
+    return await async_crud.create_task(task)
+
+@app.post("/tasks/bulk", response_model=TaskBulkResult)
+async def create_tasks_bulk(tasks: List[TaskCreate]):
+    """
+    批量创建任务，单事务写入，返回新任务id列表。
+    """
+    return {"ids": await async_crud.create_tasks_bulk(tasks)}
+
+@app.get("/tasks/", response_model=Union[TaskCursorPage, List[TaskOut], TaskSummaryCursorPage, List[TaskSummaryOut]])
+async def read_tasks(
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    sort: Optional[str] = Query(None, regex="^(created_at|updated_at|priority)$"),
+    order: str = Query("desc", regex="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    view: str = Query("full", regex=VIEW_PATTERN),
+    tag: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    默认按skip/limit返回任务列表；传入sort或cursor时切换为游标分页，返回items和next_cursor。
+    view=summary 时不返回描述和附件。
+    """
+    if sort is None and cursor is None:
+        items = await async_crud.get_tasks(db, skip=skip, limit=limit, view=view, tag=tag)
+        if view == "summary":
+            return summary_response(List[TaskSummaryOut], items)
+        return items
+    try:
+        items, next_cursor = await async_crud.get_tasks_page(db, sort=sort or "created_at", order=order, cursor=cursor, limit=limit, view=view, tag=tag)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if view == "summary":
+        return summary_response(TaskSummaryCursorPage, {"items": items, "next_cursor": next_cursor})
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/tasks/search", response_model=Union[TaskPage, TaskSummaryPage])
+async def search_tasks(
+    q: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    type: Optional[str] = None,
+    priority: Optional[str] = None,
+    tag: Optional[str] = None,
+    created_from: Optional[datetime.date] = None,
+    created_to: Optional[datetime.date] = None,
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    view: str = Query("full", regex=VIEW_PATTERN),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    按关键词、状态、类型、优先级、标签和创建时间区间筛选任务，返回总数和当前页。
+    """
+    total, items = await async_crud.search_tasks(
+        db, keyword=q, statuses=status, type=type, priority=priority, tag=tag,
+        created_from=created_from, created_to=created_to, skip=skip, limit=limit, view=view
+    )
+    if view == "summary":
+        return summary_response(TaskSummaryPage, {"total": total, "items": items})
+    return {"total": total, "items": items}
+
+@app.get("/tasks/fulltext", response_model=List[TaskHit])
+async def fulltext_search(q: str, limit: int = Query(20, le=200)):
+    """
+    全文检索标题、描述和标签，按BM25相关度排序。
+    """
+    return [{"score": score, "task": task} for score, task in await async_crud.fulltext_search(q, limit=limit)]
+
+@app.get("/search/semantic", response_model=List[TaskHit])
+async def semantic_search(q: str, limit: int = Query(10, ge=1, le=200), db: AsyncSession = Depends(get_async_read_db)):
+    """
+    语义检索：按向量余弦相似度排序，可匹配换了说法但用词有重叠的任务。
+    向量索引在后台构建完成之前退回全文检索。
+    """
+    hits = await run_in_threadpool(semantic.search, q, limit)
+    if hits is None:
+        return await fulltext_search(q, limit=limit)
+    return [{"score": score, "task": task} for score, task in await async_crud.get_scored_tasks(db, [h for h in hits if h[1] > 0])]
+
+@app.get("/tasks/stats", response_model=TaskStats)
+async def task_stats(days: int = Query(30, ge=1, le=366), weeks: int = Query(12, ge=1, le=104)):
+    """
+    按状态、类型、优先级、标签统计任务数，以及最近每天/每周完成数。
+    """
+    return await async_crud.get_task_stats(days=days, weeks=weeks)
+
+@app.get("/tasks/changes", response_model=TaskChanges)
+async def task_changes(since: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000), db: AsyncSession = Depends(get_async_read_db)):
+    """
+    增量同步：返回变更序号大于 since 的任务、附件和删除记录。
+    首次同步传 since=0；之后用返回的 next_since 继续，has_more 为真时说明还有未取完的变更。
+    """
+    return await async_crud.get_changes(db, since=since, limit=limit)
 
-@app.get("/tasks/", response_model=list[TaskOut])
-def read_tasks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_tasks(db, skip=skip, limit=limit)
+@app.get("/tags", response_model=List[TagCount])
+async def read_tags(limit: int = Query(100, le=1000), db: AsyncSession = Depends(get_async_read_db)):
+    """
+    标签分面统计：每个标签关联的任务数，按数量降序。
+    """
+    return await async_crud.get_tag_facets(db, limit=limit)
 
 @app.get("/tasks/{task_id}", response_model=TaskOut)
-def read_task(task_id: int, db: Session = Depends(get_db)):
-    db_task = crud.get_task(db, task_id)
+async def read_task(task_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    db_task = await async_crud.get_task(db, task_id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return db_task
 
 @app.put("/tasks/{task_id}", response_model=TaskOut)
-def update_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db)):
-    db_task = crud.update_task(db, task_id, task)
+async def update_task(task_id: int, task: TaskUpdate):
+    db_task = await async_crud.update_task(task_id, task)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return db_task
 
 @app.delete("/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
-    db_task = crud.delete_task(db, task_id)
+async def delete_task(task_id: int):
+    db_task = await async_crud.delete_task(task_id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return {"ok": True}
 
 # 附件上传API
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = config.UPLOAD_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @app.post("/tasks/{task_id}/attachments/")
-def upload_attachment(task_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_location, "wb") as f:
-        f.write(file.file.read())
-    attachment = crud.create_attachment(
-        db,
-        filename=file.filename,
-        filepath=file_location,
-        filetype=file.content_type,
-        task_id=task_id
-    )
+async def upload_attachment(task_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    # 分块流式写入内容寻址存储，内存占用与文件大小无关；同名文件互不覆盖，相同内容只存一份
+    try:
+        sha256, size, tmp_path = await run_in_threadpool(storage.stage_stream, file.file)
+    except storage.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    # 引用计数提交后再把文件放到位，避免与删除附件时的回收交错丢失内容
+    try:
+        attachment = await async_crud.create_attachment(
+            db=db,
+            filename=file.filename,
+            filepath=storage.blob_path(sha256),
+            filetype=file.content_type,
+            task_id=task_id,
+            size=size,
+            sha256=sha256
+        )
+    except BaseException:
+        storage.discard(tmp_path)
+        raise
+    file_location = await run_in_threadpool(storage.commit_blob, tmp_path, sha256)
+    # 缩略图和文本抽取在后台进行，不阻塞上传请求
+    if previews.is_image(file.content_type):
+        previews.schedule(file_location)
+    extraction.schedule(attachment.id)
     return {"filename": file.filename, "id": attachment.id}
 
+@app.post("/tasks/{task_id}/attachments/batch", response_model=List[AttachmentUploadResult])
+async def upload_attachments_batch(task_id: int, files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    一次请求上传多个附件：并发写入存储，附件记录单事务写入，逐个返回结果。
+    """
+    saved = await asyncio.gather(
+        *(run_in_threadpool(storage.stage_stream, f.file) for f in files),
+        return_exceptions=True,
+    )
+    # 有一个被取消（请求中断）时整个请求作废：删掉其余已写好的临时文件再把取消抛出去
+    cancelled = next((o for o in saved if isinstance(o, BaseException) and not isinstance(o, Exception)), None)
+    if cancelled is not None:
+        for outcome in saved:
+            if not isinstance(outcome, BaseException):
+                storage.discard(outcome[2])
+        raise cancelled
+    results = [{"filename": f.filename, "ok": False, "id": None, "error": None} for f in files]
+    rows, row_index, staged = [], [], []
+    for i, (f, outcome) in enumerate(zip(files, saved)):
+        if isinstance(outcome, storage.UploadTooLarge):
+            results[i]["error"] = str(outcome)
+            continue
+        if isinstance(outcome, BaseException):
+            # 内部错误（磁盘、路径等）只记日志，不把异常原文返回给客户端
+            logger.error("保存附件 %s 失败", f.filename, exc_info=outcome)
+            results[i]["error"] = "保存文件失败"
+            continue
+        sha256, size, tmp_path = outcome
+        rows.append({"filename": f.filename, "filepath": storage.blob_path(sha256), "filetype": f.content_type, "size": size, "sha256": sha256})
+        row_index.append(i)
+        staged.append((tmp_path, sha256))
+    if rows:
+        try:
+            attachments = await async_crud.create_attachments_bulk(db, task_id, rows)
+        except BaseException:
+            for tmp_path, _ in staged:
+                storage.discard(tmp_path)
+            raise
+        for tmp_path, sha256 in staged:
+            await run_in_threadpool(storage.commit_blob, tmp_path, sha256)
+        for i, attachment in zip(row_index, attachments):
+            results[i].update(ok=True, id=attachment.id)
+            if previews.is_image(attachment.filetype):
+                previews.schedule(attachment.filepath)
+            extraction.schedule(attachment.id)
+    return results
+
 @app.get("/attachments/{attachment_id}/download")
-def download_attachment(attachment_id: int, db: Session = Depends(get_db)):
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+async def download_attachment(attachment_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    下载附件，支持 ETag/Last-Modified 条件请求（304）和 Range 分段下载（206）。
+    """
+    attachment = await async_crud.get_attachment(db, attachment_id)
     if not attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
-    return FileResponse(path=attachment.filepath, filename=attachment.filename)
+    if not os.path.exists(attachment.filepath):
+        raise HTTPException(status_code=404, detail="Attachment file missing")
+    return file_response(
+        request,
+        attachment.filepath,
+        attachment.filename,
+        media_type=attachment.filetype,
+        etag_value=attachment.sha256,
+        last_modified=attachment.uploaded_at,
+    )
 
-@app.delete("/attachments/{attachment_id}")
-def delete_attachment(attachment_id: int, db: Session = Depends(get_db)):
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+@app.get("/attachments/{attachment_id}/thumbnail")
+async def attachment_thumbnail(attachment_id: int, request: Request, size: int = config.THUMBNAIL_SIZES[0], db: AsyncSession = Depends(get_async_db)):
+    """
+    图片附件缩略图。尚未生成完时返回202，客户端稍后重试。
+    """
+    if size not in config.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size 可选值: {list(config.THUMBNAIL_SIZES)}")
+    attachment = await async_crud.get_attachment(db, attachment_id)
     if not attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
-    # 删除本地文件
-    if os.path.exists(attachment.filepath):
-        os.remove(attachment.filepath)
-    db.delete(attachment)
-    db.commit()
+    if not previews.is_image(attachment.filetype) or not os.path.exists(attachment.filepath):
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    path = previews.thumbnail_path(attachment.filepath, size)
+    if not os.path.exists(path):
+        # 兼容功能上线前上传的图片：按需补投递
+        previews.schedule(attachment.filepath)
+        return JSONResponse({"detail": "Thumbnail not ready"}, status_code=202, headers={"Retry-After": "1"})
+    filename = f"{os.path.splitext(attachment.filename)[0]}_{size}.{previews.THUMBNAIL_FORMAT}"
+    etag_value = f"{attachment.sha256}-{size}" if attachment.sha256 else None
+    return file_response(request, path, filename, media_type=previews.THUMBNAIL_MEDIA_TYPE,
+                         etag_value=etag_value, last_modified=attachment.uploaded_at)
+
+@app.delete("/attachments/{attachment_id}")
+async def delete_attachment(attachment_id: int):
+    # 内容仍被其他附件引用时保留文件
+    if await async_crud.delete_attachment(attachment_id) is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
     return {"ok": True}
 
+async def analysis_prompt(prompt: str):
+    """
+    检索与问题相关的任务和附件片段，连同统计汇总按token预算装进用户消息；返回 (用户消息, token说明)。
+    """
+    # 向量索引未就绪时只用全文检索的结果
+    semantic_hits = await run_in_threadpool(semantic.search, prompt, config.ANALYSIS_RETRIEVE_LIMIT) or []
+    context, tokens = await async_crud.build_analysis_context(
+        prompt, semantic_hits, config.ANALYSIS_CONTEXT_TOKENS, retrieve_limit=config.ANALYSIS_RETRIEVE_LIMIT
+    )
+    user_prompt = f"{context}\n\n问题：{prompt}"
+    tokens["prompt_tokens"] = estimate_tokens(DATA_ANALYSIS_SYSTEM_PROMPT) + estimate_tokens(user_prompt)
+    return user_prompt, tokens
+
+def finish_tokens(tokens: dict, result: str):
+    tokens["completion_tokens"] = estimate_tokens(result)
+    tokens["total_tokens"] = tokens["prompt_tokens"] + tokens["completion_tokens"]
+    return tokens
+
+@jobs.handler("data_analysis")
+async def data_analysis(db: AsyncSession, payload: dict):
+    user_prompt, tokens = await analysis_prompt(payload["prompt"])
+    ai_content = await llm_client.get_client().chat(DATA_ANALYSIS_SYSTEM_PROMPT, user_prompt, no_cache=payload.get("no_cache", False))
+    return {"result": ai_content, "tokens": finish_tokens(tokens, ai_content)}
+
 @app.post("/ai_data_analysis/")
-def ai_data_analysis(prompt: str = Body(..., embed=True)):
-    """
-    输入一句话，调用DeepSeek API进行数据分析。
-    """
-    DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
-    DEEPSEEK_API_KEY = "sk-a9890582d5d54c78b952f0805da434df"
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": "你是一个数据分析助手，请根据用户输入进行数据分析，返回简明结论。"},
-            {"role": "user", "content": prompt}
-        ]
-    }
+async def ai_data_analysis(prompt: str = Body(..., embed=True), no_cache: bool = Body(False), job: bool = Body(False)):
+    """
+    输入一句话，附带相关任务数据调用DeepSeek API进行数据分析。no_cache=true 时跳过响应缓存。
+    tokens 为估算的token用量（上下文、输入、输出）。job=true 时只入队并返回202和任务id。
+    """
+    payload = {"prompt": prompt, "no_cache": no_cache}
+    if job:
+        return job_accepted(await jobs.enqueue("data_analysis", payload))
+    user_prompt, tokens = await analysis_prompt(prompt)
     try:
-        resp = requests.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=30)
-        resp.raise_for_status()
-        ai_content = resp.json()["choices"][0]["message"]["content"]
+        ai_content = await llm_client.get_client().chat(DATA_ANALYSIS_SYSTEM_PROMPT, user_prompt, no_cache=no_cache)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI数据分析失败: {e}")
-    return {"result": ai_content}
+    return {"result": ai_content, "tokens": finish_tokens(tokens, ai_content)}
+
+@app.post("/ai_data_analysis/stream")
+async def ai_data_analysis_stream(prompt: str = Body(..., embed=True), no_cache: bool = Body(False)):
+    """
+    流式数据分析：先推送 context（上下文token估算），模型输出的每段增量以SSE事件推送，结束时推送 done（含token用量）。
+    """
+    user_prompt, tokens = await analysis_prompt(prompt)
+
+    async def events():
+        yield sse_event(tokens, event="context")
+        parts = []
+        try:
+            async for delta in llm_client.get_client().stream_chat(DATA_ANALYSIS_SYSTEM_PROMPT, user_prompt, no_cache=no_cache):
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            yield sse_event({"tokens": finish_tokens(tokens, "".join(parts))}, event="done")
+        except Exception as e:
+            yield sse_event({"detail": f"AI数据分析失败: {e}"}, event="error")
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/jobs/{job_id}", response_model=JobOut)
+async def read_job(job_id: int):
+    """
+    查询AI任务的状态（queued/running/succeeded/failed）；成功时 result 与同步接口的返回相同。
+    """
+    job = await jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-img = paste_image_button("请粘贴图片", key="paste_img")
\ No newline at end of file
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Prometheus 文本格式的进程内指标。
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ai_cache/stats")
+async def ai_cache_stats():
+    """
+    大模型响应缓存的命中/未命中计数。
+    """
+    cache = llm_client.get_client().cache
+    return cache.snapshot() if cache is not None else {"enabled": False}
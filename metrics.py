@@ -0,0 +1,236 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from sqlalchemy import event
+import config
+
+# 进程内指标：按接口的请求延迟直方图、每个请求的SQL条数和耗时、连接池取连接等待、大模型调用耗时和token用量、
+# 上传/下载字节数，以 Prometheus 文本格式由 /metrics 输出。多进程部署时每个进程各自计数，由 Prometheus 分别抓取。
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+RATE_BUCKETS = tuple(2 ** n * 1024 for n in range(6, 17, 2))  # 64KiB/s ~ 64MiB/s
+TRANSFER_MIN_BYTES = 64 * 1024  # 小于该大小的请求传输速率无意义，不计入速率直方图
+STATEMENT_CHARS = 300
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # 标签 -> [各桶计数（非累积）, 总和, 次数]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+_registry = []
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP请求耗时（到响应体发送完毕）", ("method", "route"))
+HTTP_SQL_COUNT = Histogram("http_request_sql_statements", "每个请求执行的SQL条数", ("route",), SQL_COUNT_BUCKETS)
+HTTP_SQL_TIME = Histogram("http_request_sql_seconds", "每个请求的SQL累计耗时", ("route",))
+HTTP_RECEIVED = Counter("http_request_bytes_total", "收到的请求体字节数", ("route",))
+HTTP_SENT = Counter("http_response_bytes_total", "发送的响应体字节数", ("route",))
+HTTP_TRANSFER_RATE = Histogram(
+    "http_transfer_bytes_per_second", "单个请求的传输速率（仅统计超过64KiB的上传/下载）", ("route", "direction"), RATE_BUCKETS,
+)
+SQL_LATENCY = Histogram("db_statement_duration_seconds", "单条SQL耗时", ("operation",))
+POOL_CHECKOUT = Histogram("db_pool_checkout_seconds", "从连接池取得连接的耗时（含等待空闲连接和新建连接）", ("pool",))
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "大模型调用耗时（流式为收完全部内容）", ("mode", "outcome"))
+LLM_FIRST_TOKEN = Histogram("llm_first_token_seconds", "流式调用收到首段内容的耗时")
+LLM_TOKENS = Counter("llm_tokens_total", "大模型返回的token用量", ("type",))
+
+# 当前请求的统计，由中间件创建；SQL事件和大模型调用往里累加（异步会话的 run_sync 同样能取到）
+_request = contextvars.ContextVar("metrics_request", default=None)
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_time", "queries", "llm_time")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.queries = []  # (耗时, 语句)，只保留最慢的若干条
+        self.llm_time = 0.0
+
+    def add_query(self, duration: float, statement: str):
+        self.sql_count += 1
+        self.sql_time += duration
+        if config.METRICS_SLOW_REQUEST_SECONDS > 0:
+            self.queries.append((duration, statement))
+            if len(self.queries) > config.METRICS_SLOW_QUERIES * 4:
+                self.queries = sorted(self.queries, reverse=True)[:config.METRICS_SLOW_QUERIES]
+
+    def worst_queries(self):
+        return sorted(self.queries, reverse=True)[:config.METRICS_SLOW_QUERIES]
+
+# SQLAlchemy 事件：每条语句计时
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    SQL_LATENCY.observe(duration, operation=operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER")
+    stats = _request.get()
+    if stats is not None:
+        stats.add_query(duration, statement[:STATEMENT_CHARS])
+
+def _handle_error(exception_context):
+    # 出错的语句不会触发 after_cursor_execute，弹出开始时间避免错位
+    starts = exception_context.connection.info.get("metrics_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine):
+    """
+    给同步引擎挂上SQL计时事件；异步引擎传 async_engine.sync_engine。
+    """
+    if not config.METRICS_ENABLED or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def observe_pool_checkout(pool: str, seconds: float):
+    POOL_CHECKOUT.observe(seconds, pool=pool)
+
+# 大模型调用
+
+def observe_llm(mode: str, outcome: str, seconds: float, usage: dict = None):
+    LLM_LATENCY.observe(seconds, mode=mode, outcome=outcome)
+    stats = _request.get()
+    if stats is not None:
+        stats.llm_time += seconds
+    if usage:
+        count_tokens(usage)
+
+def count_tokens(usage: dict):
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.inc(usage[kind], type=kind.split("_")[0])
+
+# ASGI中间件：不经过 BaseHTTPMiddleware，流式响应不会被缓冲，耗时记到最后一个字节发出
+
+def _route(scope) -> str:
+    # 用路由模板而不是实际路径作标签，避免 /tasks/1、/tasks/2 各成一个序列
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request.set(stats)
+        start = time.perf_counter()
+        received, sent, status = 0, 0, [500]
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            _request.reset(token)
+            self._record(scope, stats, time.perf_counter() - start, status[0], received, sent)
+
+    @staticmethod
+    def _record(scope, stats: RequestStats, duration: float, status: int, received: int, sent: int):
+        route, method = _route(scope), scope["method"]
+        HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+        HTTP_LATENCY.observe(duration, method=method, route=route)
+        HTTP_SQL_COUNT.observe(stats.sql_count, route=route)
+        HTTP_SQL_TIME.observe(stats.sql_time, route=route)
+        HTTP_RECEIVED.inc(received, route=route)
+        HTTP_SENT.inc(sent, route=route)
+        if duration > 0:
+            if received >= TRANSFER_MIN_BYTES:
+                HTTP_TRANSFER_RATE.observe(received / duration, route=route, direction="upload")
+            if sent >= TRANSFER_MIN_BYTES:
+                HTTP_TRANSFER_RATE.observe(sent / duration, route=route, direction="download")
+        threshold = config.METRICS_SLOW_REQUEST_SECONDS
+        if threshold > 0 and duration >= threshold:
+            worst = "".join(f"\n  {seconds * 1000:.1f}ms {statement}" for seconds, statement in stats.worst_queries())
+            logger.warning(
+                "慢请求 %s %s -> %s 耗时%.3fs SQL %d条/%.3fs 大模型%.3fs%s",
+                method, scope.get("path"), status, duration, stats.sql_count, stats.sql_time, stats.llm_time, worst,
+            )
@@ -0,0 +1,43 @@
+from sqlalchemy import case, inspect, text
+from sqlalchemy.orm import Session
+from models import Base, Task, SearchStat, SearchPosting, TaskTag, ChangeLog, PRIORITY_RANKS
+import fulltext
+import tags
+import changes
+
+# 轻量级结构升级：create_all 只会建新表，已有表上新增的列和索引在这里补齐
+
+def upgrade(engine):
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+    backfill(engine)
+
+def backfill(engine):
+    # 新建的派生表（全文索引、规范化标签、变更日志）需要从已有任务回填
+    with Session(engine) as db:
+        # 升级前的任务没有 priority_rank
+        if db.query(Task.id).filter(Task.priority_rank.is_(None)).first() is not None:
+            rank = case(PRIORITY_RANKS, value=Task.priority, else_=PRIORITY_RANKS["normal"])
+            db.query(Task).filter(Task.priority_rank.is_(None)).update({Task.priority_rank: rank}, synchronize_session=False)
+            db.commit()
+        # 升级前建的倒排项没有 impact，整体重建一次
+        if (db.query(SearchStat).first() is None and db.query(Task.id).first() is not None) \
+                or db.query(SearchPosting.term).filter(SearchPosting.impact.is_(None)).first() is not None:
+            fulltext.rebuild(db)
+        if db.query(TaskTag).first() is None and db.query(Task.id).filter(Task.tags.isnot(None), Task.tags != "").first() is not None:
+            tags.backfill(db)
+        if db.query(ChangeLog.seq).first() is None and db.query(Task.id).first() is not None:
+            changes.backfill(db)
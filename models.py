@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 import datetime
 
 Base = declarative_base()
 
+# 优先级的排序值：按优先级排序时用数值而不是字符串（字符串序为 high < low < normal）
+PRIORITY_RANKS = {"low": 0, "normal": 1, "high": 2}
+
+def priority_rank(priority: str) -> int:
+    # 未知取值按 normal 排
+    return PRIORITY_RANKS.get(priority, PRIORITY_RANKS["normal"])
+
 class Task(Base):
     __tablename__ = 'tasks'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -13,18 +20,127 @@ class Task(Base):
     type = Column(String(50), default='knowledge')  # knowledge, work
     status = Column(String(50), default='pending')  # pending, in_progress, completed, paused
     priority = Column(String(50), default='normal')  # low, normal, high
+    priority_rank = Column(Integer, default=PRIORITY_RANKS["normal"])  # 随 priority 维护，见 PRIORITY_RANKS
     tags = Column(String(255))  # 逗号分隔
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     completed_at = Column(DateTime)
+    insert_token = Column(String(40), index=True)  # 批量创建时的行标记，用于取回各行的自增id，见 crud._insert_tasks
     attachments = relationship('Attachment', back_populates='task')
 
+    # 查询用复合索引：等值条件在前，created_at 范围/排序在后
+    __table_args__ = (
+        Index('ix_tasks_created_at_id', 'created_at', 'id'),
+        Index('ix_tasks_updated_at_id', 'updated_at', 'id'),
+        Index('ix_tasks_priority_rank_id', 'priority_rank', 'id'),
+        Index('ix_tasks_status_created_at', 'status', 'created_at'),
+        Index('ix_tasks_type_created_at', 'type', 'created_at'),
+        Index('ix_tasks_priority_created_at', 'priority', 'created_at'),
+    )
+
+    @validates('priority')
+    def _sync_priority_rank(self, key, value):
+        self.priority_rank = priority_rank(value)
+        return value
+
 class Attachment(Base):
     __tablename__ = 'attachments'
     id = Column(Integer, primary_key=True, autoincrement=True)
     filename = Column(String(255), nullable=False)
     filepath = Column(String(255), nullable=False)
     filetype = Column(String(255))
+    size = Column(BigInteger)  # 字节数
+    sha256 = Column(String(64), index=True)
     uploaded_at = Column(DateTime, default=datetime.datetime.utcnow)
     task_id = Column(Integer, ForeignKey('tasks.id'))
-    task = relationship('Task', back_populates='attachments') 
\ No newline at end of file
+    task = relationship('Task', back_populates='attachments')
+
+# 附件抽取出的文本：每个附件一行，status 为 done/failed/timeout/unsupported，只有 done 才有 text
+class AttachmentText(Base):
+    __tablename__ = 'attachment_texts'
+    attachment_id = Column(Integer, ForeignKey('attachments.id'), primary_key=True)
+    task_id = Column(Integer, index=True)
+    status = Column(String(16), nullable=False)
+    error = Column(String(255))
+    chars = Column(Integer, nullable=False, default=0)
+    text = Column(Text(16777215))  # MySQL 下为 MEDIUMTEXT
+    extracted_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# 规范化标签：Task.tags 逗号串保留作兼容视图，筛选和统计走 tags/task_tags
+class Tag(Base):
+    __tablename__ = 'tags'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(64), nullable=False, unique=True)
+
+class TaskTag(Base):
+    __tablename__ = 'task_tags'
+    task_id = Column(Integer, ForeignKey('tasks.id'), primary_key=True)
+    tag_id = Column(Integer, ForeignKey('tags.id'), primary_key=True)
+    __table_args__ = (
+        Index('ix_task_tags_tag_id_task_id', 'tag_id', 'task_id'),
+    )
+
+# 内容寻址的附件文件：按 sha256 存一份，ref_count 为引用它的附件数
+class Blob(Base):
+    __tablename__ = 'blobs'
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# 全文检索倒排表：每个(词项, 任务)一行，doc_len 冗余存储便于BM25打分时免去回表；
+# impact 为建索引时算好的BM25词频分量，按 (term, impact) 索引可从高分往低分读，读够即停；
+# (task_id, term, impact) 索引供按任务补齐其他词项得分、删除任务索引使用
+class SearchPosting(Base):
+    __tablename__ = 'search_postings'
+    term = Column(String(64), primary_key=True)
+    task_id = Column(Integer, primary_key=True)
+    tf = Column(Integer, nullable=False)
+    doc_len = Column(Integer, nullable=False)
+    impact = Column(Float)
+    __table_args__ = (
+        Index('ix_search_postings_term_impact', 'term', 'impact', 'task_id'),
+        Index('ix_search_postings_task_term', 'task_id', 'term', 'impact'),
+    )
+
+# 全文检索全局统计（单行），随索引增量维护
+class SearchStat(Base):
+    __tablename__ = 'search_stats'
+    id = Column(Integer, primary_key=True)
+    doc_count = Column(Integer, nullable=False, default=0)
+    total_length = Column(Integer, nullable=False, default=0)
+
+# 变更日志：每个实体只保留最近一条（upsert/delete），seq 单调递增作为增量同步的水位
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(16), nullable=False)  # task, attachment
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(8), nullable=False)  # upsert, delete
+    task_id = Column(Integer)  # 附件所属任务
+    changed_at = Column(DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        Index('ix_change_log_entity_entity_id', 'entity', 'entity_id'),
+        # 旧记录会被删除，SQLite 需 AUTOINCREMENT 才不会复用最大的 seq
+        {'sqlite_autoincrement': True},
+    )
+
+# AI异步任务队列：status 为 queued/running/succeeded/failed；running 超过 locked_until 视为执行者已失联，可被重新领取
+class AIJob(Base):
+    __tablename__ = 'ai_jobs'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False, default='queued')
+    payload = Column(Text, nullable=False)  # JSON
+    result = Column(Text)  # JSON
+    error = Column(String(500))
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=1)
+    run_after = Column(DateTime, default=datetime.datetime.utcnow)
+    locked_until = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    __table_args__ = (
+        Index('ix_ai_jobs_status_run_after', 'status', 'run_after'),
+    )
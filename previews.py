@@ -0,0 +1,77 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+# 图片附件缩略图：上传后投递到后台线程池，按固定边长生成 WebP（不支持时退回 PNG），
+# 与原文件放在一起：<原文件路径>.<边长>.<格式>
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps, features
+    THUMBNAIL_FORMAT = "webp" if features.check("webp") else "png"
+except ImportError:  # 未安装 Pillow 时不生成缩略图
+    Image = None
+    THUMBNAIL_FORMAT = "png"
+
+THUMBNAIL_MEDIA_TYPE = f"image/{THUMBNAIL_FORMAT}"
+
+_executor = ThreadPoolExecutor(max_workers=config.THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+_pending = set()
+_pending_lock = threading.Lock()
+
+def is_image(filetype: str) -> bool:
+    return Image is not None and bool(filetype) and filetype.startswith("image/")
+
+def thumbnail_path(path: str, size: int) -> str:
+    return f"{path}.{size}.{THUMBNAIL_FORMAT}"
+
+def _generate(path: str):
+    try:
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            # 从大到小依次缩，小图基于上一档结果，避免重复解码大图
+            for size in sorted(config.THUMBNAIL_SIZES, reverse=True):
+                target = thumbnail_path(path, size)
+                if os.path.exists(target):
+                    continue
+                img.thumbnail((size, size))
+                tmp = f"{target}.tmp"
+                img.save(tmp, format=THUMBNAIL_FORMAT.upper())
+                os.replace(tmp, target)
+    except Exception:
+        logger.exception("生成缩略图失败: %s", path)
+    finally:
+        with _pending_lock:
+            _pending.discard(path)
+
+def schedule(path: str) -> bool:
+    """
+    投递缩略图生成任务，立即返回；已在队列中或已全部生成时不重复投递。
+    """
+    if Image is None:
+        return False
+    if all(os.path.exists(thumbnail_path(path, size)) for size in config.THUMBNAIL_SIZES):
+        return False
+    with _pending_lock:
+        if path in _pending:
+            return False
+        _pending.add(path)
+    _executor.submit(_generate, path)
+    return True
+
+def is_pending(path: str) -> bool:
+    with _pending_lock:
+        return path in _pending
+
+def remove_thumbnails(path: str):
+    for size in config.THUMBNAIL_SIZES:
+        target = thumbnail_path(path, size)
+        if os.path.exists(target):
+            os.remove(target)
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, validator
+from typing import Any, Optional, List, Dict
+import json
 import datetime
 
 class AttachmentOut(BaseModel):
@@ -7,6 +8,8 @@ class AttachmentOut(BaseModel):
     filename: str
     filepath: str
     filetype: Optional[str]
+    size: Optional[int]
+    sha256: Optional[str]
     uploaded_at: datetime.datetime
     class Config:
         orm_mode = True
@@ -42,4 +45,97 @@ class TaskOut(BaseModel):
     completed_at: Optional[datetime.datetime]
     attachments: List[AttachmentOut] = []
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+class TaskSummaryOut(BaseModel):
+    id: int
+    title: str
+    type: str
+    status: str
+    priority: str
+    tags: Optional[str]
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    completed_at: Optional[datetime.datetime]
+    class Config:
+        orm_mode = True
+
+class TaskPage(BaseModel):
+    total: int
+    items: List[TaskOut] = []
+
+class TaskHit(BaseModel):
+    score: float
+    task: TaskOut
+
+class TaskCursorPage(BaseModel):
+    items: List[TaskOut] = []
+    next_cursor: Optional[str]
+
+class TaskSummaryPage(BaseModel):
+    total: int
+    items: List[TaskSummaryOut] = []
+
+class TaskSummaryCursorPage(BaseModel):
+    items: List[TaskSummaryOut] = []
+    next_cursor: Optional[str]
+
+class TaskStats(BaseModel):
+    total: int
+    by_status: Dict[str, int] = {}
+    by_type: Dict[str, int] = {}
+    by_priority: Dict[str, int] = {}
+    by_tag: Dict[str, int] = {}
+    completed_per_day: Dict[str, int] = {}
+    completed_per_week: Dict[str, int] = {}
+
+class TaskBulkResult(BaseModel):
+    ids: List[int] = []
+
+class AttachmentUploadResult(BaseModel):
+    filename: str
+    ok: bool
+    id: Optional[int]
+    error: Optional[str]
+
+class TagCount(BaseModel):
+    name: str
+    count: int
+
+class ChangedAttachmentOut(AttachmentOut):
+    task_id: Optional[int]
+
+class ChangeTombstone(BaseModel):
+    seq: int
+    entity: str
+    id: int
+    task_id: Optional[int]
+    deleted_at: datetime.datetime
+
+class TaskChanges(BaseModel):
+    since: int
+    next_since: int
+    has_more: bool
+    tasks: List[TaskOut] = []
+    attachments: List[ChangedAttachmentOut] = []
+    deleted: List[ChangeTombstone] = []
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    result: Optional[Any]
+    error: Optional[str]
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime]
+    finished_at: Optional[datetime.datetime]
+
+    # 库里存的是JSON文本
+    @validator("result", pre=True)
+    def parse_result(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
+from sqlalchemy.orm import Session
+from models import Task, AttachmentText
+import changes
+import config
+import database
+from embeddings import get_embedder
+
+logger = logging.getLogger(__name__)
+
+# 语义检索：任务向量存在磁盘上的连续 float32 矩阵（内存映射），按行号寻址；
+# 通过变更日志增量同步（只向量化有变化的任务），查询为分块矩阵乘 + top-k，
+# 任务数超过阈值后启用IVF粗分区，只扫描与查询最近的若干分区。
+
+TITLE_BOOST = 2
+SYNC_BATCH = 1000
+SCAN_BLOCK = 65536  # 暴力检索时每次参与矩阵乘的行数，限制临时内存
+IVF_REBUILD_RATIO = 0.2  # 建分区后新增/修改的行超过该比例时重建
+IVF_TRAIN_SAMPLE = 100000
+IVF_ITERATIONS = 8
+
+def task_text(title: str, description: str, tags: str, attachments: str = "") -> str:
+    parts = [title or ""] * TITLE_BOOST + [description or "", (tags or "").replace(",", " "), attachments]
+    return "\n".join(parts)
+
+class VectorIndex:
+    """
+    vectors.f32 为 capacity x dim 矩阵，ids.i64 记录每行对应的任务id（0为空行），
+    meta.json 记录维度、向量器、已用行数和已同步到的变更序号。
+    """
+
+    def __init__(self, directory: str, embedder, ivf_threshold: int = 50000, nprobe: int = 16):
+        self.directory = directory
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        self._ivf = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        meta = None
+        if os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+        # 维度或向量器变了，旧向量不可比，清空后从头同步
+        if meta is None or meta["dim"] != self.dim or meta["embedder"] != self.embedder.name:
+            self.seq, self.size, self.capacity = 0, 0, 0
+            self._open(1024, create=True)
+            return
+        self.seq, self.size = meta["seq"], meta["size"]
+        self._open(meta["capacity"])
+        ids = np.asarray(self.ids[:self.size])
+        live = np.flatnonzero(ids)
+        self.rows = dict(zip(ids[live].tolist(), live.tolist()))
+        self.free = np.flatnonzero(ids == 0).tolist()
+
+    def _open(self, capacity: int, create: bool = False):
+        mode = "w+" if create else "r+"
+        self.vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+        self.ids = np.memmap(self._path("ids.i64"), dtype=np.int64, mode=mode, shape=(capacity,))
+        self.capacity = capacity
+        if create:
+            self.rows, self.free = {}, []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _allocate(self) -> int:
+        if self.free:
+            return self.free.pop()
+        if self.size == self.capacity:
+            # 扩容：文件加长后重新映射，已有数据不动
+            self.vectors.flush()
+            self.ids.flush()
+            for name, itemsize in (("vectors.f32", 4 * self.dim), ("ids.i64", 8)):
+                with open(self._path(name), "r+b") as f:
+                    f.truncate(self.capacity * 2 * itemsize)
+            self._open(self.capacity * 2)
+        self.size += 1
+        return self.size - 1
+
+    def upsert(self, task_ids, vectors: np.ndarray):
+        with self.lock:
+            touched = []
+            for task_id, vector in zip(task_ids, vectors):
+                row = self.rows.get(task_id)
+                if row is None:
+                    row = self._allocate()
+                    self.rows[task_id] = row
+                    self.ids[row] = task_id
+                self.vectors[row] = vector
+                touched.append(row)
+            if self._ivf is not None:
+                self._ivf["pending"].update(touched)
+
+    def remove(self, task_ids):
+        with self.lock:
+            for task_id in task_ids:
+                row = self.rows.pop(task_id, None)
+                if row is None:
+                    continue
+                self.vectors[row] = 0
+                self.ids[row] = 0
+                self.free.append(row)
+
+    def commit(self, seq: int):
+        """
+        先落盘向量再写水位：中途崩溃时水位偏旧，重放的变更是幂等的。
+        """
+        with self.lock:
+            self.vectors.flush()
+            self.ids.flush()
+            self.seq = seq
+            meta = {"dim": self.dim, "embedder": self.embedder.name, "size": self.size,
+                    "capacity": self.capacity, "seq": seq}
+            tmp = self._path("meta.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._path("meta.json"))
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: int = None):
+        """
+        批量余弦 top-k，queries 为已归一化的 q x dim 矩阵；返回每个查询的 [(任务id, 分数)]，分数降序。
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        with self.lock:
+            if len(self.rows) >= self.ivf_threshold:
+                return self._search_ivf(queries, k, nprobe or self.nprobe)
+            return self._search_flat(queries, k)
+
+    def _top_k(self, scores: np.ndarray, rows: np.ndarray, k: int):
+        if scores.shape[-1] > k:
+            part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+            scores = np.take_along_axis(scores, part, axis=-1)
+            rows = np.take_along_axis(rows, part, axis=-1)
+        return scores, rows
+
+    def _results(self, scores: np.ndarray, rows: np.ndarray):
+        order = np.argsort(-scores)
+        return [
+            (int(self.ids[rows[i]]), float(scores[i]))
+            for i in order if np.isfinite(scores[i])
+        ]
+
+    def _search_flat(self, queries: np.ndarray, k: int):
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+        for start in range(0, self.size, SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, self.size)
+            scores = queries @ self.vectors[start:end].T
+            scores[:, self.ids[start:end] == 0] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            best_scores, best_rows = self._top_k(
+                np.concatenate([best_scores, scores], axis=1), np.concatenate([best_rows, rows], axis=1), k
+            )
+        return [self._results(s, r) for s, r in zip(best_scores, best_rows)]
+
+    def _build_ivf(self):
+        """
+        球面k-means训练中心，所有行按最近中心分到倒排列表；之后新增/修改的行记入 pending，查询时总会扫描。
+        """
+        live = np.flatnonzero(np.asarray(self.ids[:self.size]))
+        n_lists = max(1, int(np.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(live, size=min(len(live), IVF_TRAIN_SAMPLE), replace=False))
+        train = np.asarray(self.vectors[sample])
+        centroids = train[rng.choice(len(train), size=n_lists, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            centroids = np.where(empty[:, None], train[rng.choice(len(train), size=n_lists)], sums / np.maximum(norms, 1e-12))
+        assign = np.concatenate([
+            np.argmax(np.asarray(self.vectors[live[i:i + SCAN_BLOCK]]) @ centroids.T, axis=1)
+            for i in range(0, len(live), SCAN_BLOCK)
+        ])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self._ivf = {
+            "centroids": centroids,
+            "lists": [live[order[bounds[c]:bounds[c + 1]]] for c in range(n_lists)],
+            "pending": set(),
+            "built_size": len(live),
+        }
+
+    def _search_ivf(self, queries: np.ndarray, k: int, nprobe: int):
+        ivf = self._ivf
+        if ivf is None or len(ivf["pending"]) > IVF_REBUILD_RATIO * ivf["built_size"]:
+            self._build_ivf()
+            ivf = self._ivf
+        nprobe = min(nprobe, len(ivf["lists"]))
+        probes = np.argpartition(-(queries @ ivf["centroids"].T), nprobe - 1, axis=1)[:, :nprobe]
+        pending = np.fromiter(ivf["pending"], dtype=np.int64, count=len(ivf["pending"]))
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.unique(np.concatenate([ivf["lists"][c] for c in lists] + [pending]))
+            scores = np.asarray(self.vectors[candidates]) @ query
+            scores[np.asarray(self.ids[candidates]) == 0] = -np.inf
+            scores, rows = self._top_k(scores, candidates, k)
+            results.append(self._results(scores, rows))
+        return results
+
+def sync(db: Session, index: VectorIndex):
+    """
+    按变更日志把 seq 之后有变化的任务同步进索引；从 0 开始即全量构建（日志中每个任务只有最新一条）。
+    只读到已过安全窗口的变更（见 changes.read），持久化的水位不会越过尚未提交的小 seq。
+    """
+    with index.lock:
+        since = index.seq
+        while True:
+            entries, has_more = changes.read(db, since, SYNC_BATCH, entity="task")
+            if not entries:
+                break
+            upsert_ids = [e.entity_id for e in entries if e.op == changes.UPSERT]
+            removed = {e.entity_id for e in entries if e.op == changes.DELETE}
+            rows = (
+                db.query(Task.id, Task.title, Task.description, Task.tags).filter(Task.id.in_(upsert_ids)).all()
+                if upsert_ids else []
+            )
+            if rows:
+                attachments = {}
+                for task_id, text in (
+                    db.query(AttachmentText.task_id, AttachmentText.text)
+                    .filter(AttachmentText.task_id.in_(upsert_ids), AttachmentText.text.isnot(None))
+                ):
+                    attachments[task_id] = attachments.get(task_id, "") + "\n" + text
+                texts = [task_text(r.title, r.description, r.tags, attachments.get(r.id, "")) for r in rows]
+                index.upsert([r.id for r in rows], index.embedder.embed(texts))
+            # 记为更新但已查不到的任务，随后会有删除记录，这里先移除
+            removed.update(set(upsert_ids) - {r.id for r in rows})
+            index.remove(removed)
+            since = entries[-1].seq
+            index.commit(since)
+            if not has_more:
+                break
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_index() -> VectorIndex:
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = VectorIndex(
+                config.SEMANTIC_INDEX_DIR,
+                get_embedder(config.SEMANTIC_EMBEDDER, config.SEMANTIC_DIM),
+                ivf_threshold=config.SEMANTIC_IVF_THRESHOLD,
+                nprobe=config.SEMANTIC_IVF_NPROBE,
+            )
+        return _default_index
+
+# 首次构建（或重启后追平积压的变更）可能要向量化全部任务，放在后台线程，不占用请求
+_ready = threading.Event()
+_build_thread = None
+_build_lock = threading.Lock()
+
+def _build():
+    global _build_thread
+    try:
+        index = get_index()
+        with database.ReadSessionLocal() as db:
+            sync(db, index)
+    except Exception:
+        logger.exception("构建语义索引失败，下次检索时重试")
+        with _build_lock:
+            _build_thread = None
+        return
+    _ready.set()
+
+def start():
+    """
+    在后台线程构建/追平索引，立即返回；应用启动时调用。
+    """
+    global _build_thread
+    with _build_lock:
+        if _build_thread is None and not _ready.is_set():
+            _build_thread = threading.Thread(target=_build, name="semantic-index", daemon=True)
+            _build_thread.start()
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def search(query: str, k: int = 10):
+    """
+    先追平变更再检索，返回 [(任务id, 分数)]。涉及向量化和矩阵运算，应在线程池中调用。
+    后台首次构建尚未完成时返回 None（并确保构建已开始），调用方应退回全文检索。
+    """
+    if not _ready.is_set():
+        start()
+        return None
+    index = get_index()
+    with database.ReadSessionLocal() as db:
+        sync(db, index)
+    return index.search(index.embedder.embed([query]), k)[0]
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+from sqlalchemy.orm import Session
+import config
+from models import Blob
+
+# 附件文件存储：按固定大小分块流式写入临时文件，边写边算 SHA-256 和字节数，写完原子改名。
+# 内容按哈希寻址存放在 blobs/ab/cd/<sha256> 分片目录下，相同内容只存一份，由 Blob.ref_count 记录引用数。
+# 上传：stage_stream 写临时文件 -> 事务内 acquire_blob 并提交 -> commit_blob 放到位；
+# 删除：事务内 release_blob 并提交 -> collect_blob 在锁内复查引用数为0才删文件，与并发上传相同内容不冲突。
+
+BLOB_DIR = os.path.join(config.UPLOAD_DIR, "blobs")
+TMP_DIR = os.path.join(BLOB_DIR, "tmp")
+
+class UploadTooLarge(Exception):
+    pass
+
+def _write_temp(src, dest_dir: str, max_bytes: int, chunk_size: int):
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"文件超过大小上限 {max_bytes} 字节")
+                hasher.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, size, hasher.hexdigest()
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+def is_blob_path(path: str) -> bool:
+    return os.path.abspath(path).startswith(os.path.abspath(BLOB_DIR) + os.sep)
+
+def stage_stream(src, max_bytes: int = config.MAX_UPLOAD_BYTES, chunk_size: int = config.UPLOAD_CHUNK_SIZE):
+    """
+    流式写入临时文件，返回 (sha256, 字节数, 临时文件路径)。
+    调用方在事务内 acquire_blob 并提交后再调用 commit_blob 放到内容寻址路径；失败时调用 discard 删除临时文件。
+    """
+    tmp_path, size, sha256 = _write_temp(src, TMP_DIR, max_bytes, chunk_size)
+    return sha256, size, tmp_path
+
+def commit_blob(tmp_path: str, sha256: str) -> str:
+    """
+    引用计数提交之后调用，返回存储路径：内容已存在时丢弃临时文件，否则（首次出现，或刚被回收）改名到位。
+    引用已提交，此后 collect_blob 不会再删除该内容，所以这里看到文件存在即可放心丢弃临时文件。
+    """
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path
+
+def discard(tmp_path: str):
+    remove_file(tmp_path)
+
+def acquire_blob(db: Session, sha256: str, size: int, count: int = 1):
+    # 在调用方事务内增加引用计数，首次出现时建记录
+    updated = db.query(Blob).filter(Blob.sha256 == sha256) \
+        .update({Blob.ref_count: Blob.ref_count + count}, synchronize_session=False)
+    if not updated:
+        db.add(Blob(sha256=sha256, size=size, ref_count=count))
+
+def release_blob(db: Session, sha256: str, count: int = 1):
+    # 在调用方事务内减少引用计数；归零的内容在提交后由 collect_blob 回收
+    db.query(Blob).filter(Blob.sha256 == sha256) \
+        .update({Blob.ref_count: Blob.ref_count - count}, synchronize_session=False)
+
+def collect_blob(db: Session, sha256: str) -> bool:
+    """
+    在独立事务中回收无引用的内容，返回是否删除了文件。
+    先删除 ref_count 已归零的记录（持有该行的锁），删完文件再提交：同时上传相同内容的请求累加引用时会等待该锁，
+    等到的是记录已删除，于是新建记录，提交后 commit_blob 发现文件不在会把临时文件放回。
+    """
+    deleted = db.query(Blob).filter(Blob.sha256 == sha256, Blob.ref_count <= 0).delete(synchronize_session=False)
+    if deleted:
+        remove_file(blob_path(sha256))
+    db.commit()
+    return bool(deleted)
+
+def remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,72 @@
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Task, Tag, TaskTag
+
+# 标签规范化：把 Task.tags 逗号串同步到 tags/task_tags，供索引筛选和分面统计
+
+MAX_TAG_LENGTH = 64
+
+def parse_tags(tags: str):
+    names = []
+    for name in (tags or "").replace("，", ",").split(","):
+        name = name.strip()[:MAX_TAG_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def _tag_ids(db: Session, names):
+    """
+    返回 {标签名: id}，不存在的标签就地创建。
+    """
+    if not names:
+        return {}
+    ids = dict(db.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all())
+    for name in names:
+        if name in ids:
+            continue
+        # 并发创建同名标签时唯一约束冲突，回退到查询
+        try:
+            with db.begin_nested():
+                tag = Tag(name=name)
+                db.add(tag)
+            ids[name] = tag.id
+        except IntegrityError:
+            ids[name] = db.query(Tag.id).filter(Tag.name == name).scalar()
+    return ids
+
+def remove_task(db: Session, task_id: int):
+    db.query(TaskTag).filter(TaskTag.task_id == task_id).delete(synchronize_session=False)
+
+def sync_task(db: Session, task: Task):
+    # 需在调用方事务内执行（任务须已flush拿到id）
+    remove_task(db, task.id)
+    sync_new_tasks(db, [task])
+
+def sync_new_tasks(db: Session, tasks: list):
+    parsed = [(task.id, parse_tags(task.tags)) for task in tasks]
+    ids = _tag_ids(db, sorted({name for _, names in parsed for name in names}))
+    rows = [{"task_id": task_id, "tag_id": ids[name]} for task_id, names in parsed for name in names]
+    if rows:
+        db.bulk_insert_mappings(TaskTag, rows)
+
+def backfill(db: Session, batch_size: int = 500):
+    # 从已有逗号串回填，按id分批
+    db.query(TaskTag).delete(synchronize_session=False)
+    last_id = 0
+    while True:
+        batch = db.query(Task).filter(Task.id > last_id).order_by(Task.id).limit(batch_size).all()
+        if not batch:
+            break
+        sync_new_tasks(db, batch)
+        last_id = batch[-1].id
+        db.commit()
+    db.commit()
+
+def filter_by_tag(query, tag: str):
+    return query.join(TaskTag, TaskTag.task_id == Task.id).join(Tag, Tag.id == TaskTag.tag_id).filter(Tag.name == tag)
+
+def facet_counts(db: Session, limit: int = 100):
+    count = func.count(TaskTag.task_id)
+    return db.query(Tag.name, count).join(TaskTag, TaskTag.tag_id == Tag.id) \
+        .group_by(Tag.name).order_by(count.desc(), Tag.name).limit(limit).all()
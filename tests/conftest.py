@@ -0,0 +1,52 @@
+import contextlib
+import os
+import sys
+import tempfile
+
+# 配置在导入时读取环境变量，先指向临时目录下的 SQLite 再导入应用
+_workdir = tempfile.mkdtemp(prefix="myassistant-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'app.db')}")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_workdir, "uploads"))
+os.environ.setdefault("SEMANTIC_INDEX_DIR", os.path.join(_workdir, "semantic_index"))
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    with TestClient(main.app) as c:
+        yield c
+
+@pytest.fixture
+def db():
+    import database
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def count_queries():
+    """
+    统计代码块内执行的SQL条数：with count_queries() as statements: ...，statements 为语句列表。
+    """
+    @contextlib.contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+    return counter
@@ -0,0 +1,98 @@
+import asyncio
+import io
+import os
+from starlette.datastructures import UploadFile
+import crud
+import database
+import main
+import storage
+from models import Attachment, Blob
+
+def _blob(sha256):
+    with database.SessionLocal() as db:
+        blob = db.query(Blob).filter(Blob.sha256 == sha256).first()
+        return blob.ref_count if blob else None
+
+def _upload(client, task_id, content, name="a.txt"):
+    response = client.post(f"/tasks/{task_id}/attachments/", files={"file": (name, content)})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def _new_task(client, title):
+    return client.post("/tasks/", json={"title": title}).json()["id"]
+
+def test_delete_task_releases_attachment_blobs(client):
+    content = b"shared by two tasks"
+    first, second = _new_task(client, "附件A"), _new_task(client, "附件B")
+    attachment_id = _upload(client, first, content)
+    _upload(client, second, content)
+    sha256 = client.get(f"/tasks/{first}").json()["attachments"][0]["sha256"]
+    assert _blob(sha256) == 2
+
+    client.delete(f"/tasks/{first}")
+    with database.SessionLocal() as db:
+        assert db.query(Attachment).filter(Attachment.id == attachment_id).first() is None
+    assert _blob(sha256) == 1
+    assert os.path.exists(storage.blob_path(sha256))
+
+    client.delete(f"/tasks/{second}")
+    assert _blob(sha256) is None
+    assert not os.path.exists(storage.blob_path(sha256))
+
+def test_upload_racing_with_delete_keeps_content(client):
+    # 新上传已写好临时文件、尚未提交引用时，旧附件被删除并回收了同一内容
+    content = b"deleted while uploading"
+    task_id = _new_task(client, "并发回收")
+    old_id = _upload(client, task_id, content)
+    sha256, size, tmp_path = storage.stage_stream(io.BytesIO(content))
+    assert client.delete(f"/attachments/{old_id}").status_code == 200
+    assert not os.path.exists(storage.blob_path(sha256))
+
+    with database.SessionLocal() as db:
+        crud.create_attachment(db, "b.txt", storage.blob_path(sha256), "text/plain", task_id, size=size, sha256=sha256)
+    storage.commit_blob(tmp_path, sha256)
+    assert _blob(sha256) == 1
+    with open(storage.blob_path(sha256), "rb") as f:
+        assert f.read() == content
+
+def test_collect_keeps_referenced_blob(client):
+    content = b"still referenced"
+    task_id = _new_task(client, "复查引用")
+    _upload(client, task_id, content)
+    sha256 = client.get(f"/tasks/{task_id}").json()["attachments"][0]["sha256"]
+    with database.SessionLocal() as db:
+        assert storage.collect_blob(db, sha256) is False
+    assert os.path.exists(storage.blob_path(sha256))
+
+def _failing_stage(exc):
+    real = storage.stage_stream
+
+    def stage(src, *args, **kwargs):
+        if src.read(4) == b"fail":
+            raise exc
+        src.seek(0)
+        return real(src, *args, **kwargs)
+    return stage
+
+def _tmp_files():
+    return set(os.listdir(storage.TMP_DIR)) if os.path.isdir(storage.TMP_DIR) else set()
+
+def test_batch_upload_hides_internal_errors(client, monkeypatch):
+    task_id = _new_task(client, "多文件上传错误")
+    monkeypatch.setattr(storage, "stage_stream", _failing_stage(OSError("/secret/path: disk full")))
+    files = [("files", ("ok.txt", b"fine")), ("files", ("bad.txt", b"fail"))]
+    results = client.post(f"/tasks/{task_id}/attachments/batch", files=files).json()
+    assert results[0]["ok"] is True
+    assert results[1]["ok"] is False and "/secret/path" not in results[1]["error"]
+
+def test_batch_upload_cancelled_discards_staged_files(client, monkeypatch):
+    monkeypatch.setattr(storage, "stage_stream", _failing_stage(asyncio.CancelledError()))
+    before = _tmp_files()
+    files = [UploadFile(io.BytesIO(b"staged"), filename="ok.txt"), UploadFile(io.BytesIO(b"fail"), filename="bad.txt")]
+    try:
+        asyncio.run(main.upload_attachments_batch(0, files, db=None))
+    except asyncio.CancelledError:
+        pass
+    else:
+        raise AssertionError("取消应当抛出")
+    assert _tmp_files() == before
@@ -0,0 +1,40 @@
+import datetime
+import changes
+import config
+import database
+from models import ChangeLog
+
+# 用单独的实体类型，后台任务（如附件文本抽取）同时记下的任务变更不影响断言
+ENTITY = "test-entity"
+
+def _entry(db, entity_id, age_seconds):
+    entry = ChangeLog(entity=ENTITY, entity_id=entity_id, op=changes.DELETE,
+                      changed_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=age_seconds))
+    db.add(entry)
+    db.flush()
+    return entry.seq
+
+def test_read_stops_at_first_change_inside_safe_window(client, monkeypatch):
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 5)
+    with database.SessionLocal() as db:
+        since = db.query(ChangeLog.seq).order_by(ChangeLog.seq.desc()).limit(1).scalar() or 0
+        settled = _entry(db, 900001, 60)
+        _entry(db, 900002, 0)   # 刚写入：更早分配了 seq 的事务可能还没提交
+        _entry(db, 900003, 60)
+        entries, has_more = changes.read(db, since, limit=10, entity=ENTITY)
+        assert [e.seq for e in entries] == [settled]
+        assert has_more is False
+        db.rollback()
+
+def test_feed_returns_recent_changes_once_settled(client, monkeypatch):
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 0)
+    since = client.get("/tasks/changes", params={"since": 0, "limit": 5000}).json()["next_since"]
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 5)
+    task_id = client.post("/tasks/", json={"title": "增量同步"}).json()["id"]
+    # 后台的附件文本抽取也会记任务变更，只看本测试创建的任务
+    pending = client.get("/tasks/changes", params={"since": since}).json()
+    assert task_id not in [t["id"] for t in pending["tasks"]] and pending["has_more"] is False
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 0)
+    settled = client.get("/tasks/changes", params={"since": since}).json()
+    assert task_id in [t["id"] for t in settled["tasks"]]
+    assert settled["next_since"] > since
@@ -0,0 +1,31 @@
+from sqlalchemy import event
+import database
+import extraction
+import extractors
+from models import Attachment, AttachmentText
+
+def test_save_turns_concurrent_insert_into_update(client):
+    task_id = client.post("/tasks/", json={"title": "并发抽取"}).json()["id"]
+    with database.SessionLocal() as db:
+        attachment = Attachment(task_id=task_id, filename="a.txt", filepath="/nonexistent/a.txt", size=1)
+        db.add(attachment)
+        db.commit()
+        attachment_id = attachment.id
+
+    raced = []
+
+    def insert_first(session, flush_context, instances):
+        # 本次写入第一次 flush 前，另一个抽取先提交了同一附件的结果
+        if raced:
+            return
+        raced.append(True)
+        with database.SessionLocal() as other:
+            other.add(AttachmentText(attachment_id=attachment_id, task_id=task_id, status=extractors.DONE, text="旧结果"))
+            other.commit()
+
+    with database.SessionLocal() as db:
+        event.listen(db, "before_flush", insert_first)
+        extraction._save(db, attachment_id, task_id, extractors.DONE, "新结果")
+    with database.SessionLocal() as db:
+        row = db.query(AttachmentText).filter(AttachmentText.attachment_id == attachment_id).one()
+        assert row.text == "新结果" and row.chars == 3
@@ -0,0 +1,72 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from file_responses import file_response
+
+CONTENT = bytes(range(256)) * 4  # 1024 字节
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    path = tmp_path_factory.mktemp("download") / "data.bin"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/file")
+    def download(request: Request):
+        return file_response(request, str(path), "数据.bin", media_type="application/octet-stream")
+
+    return TestClient(app)
+
+def test_full_response_has_validators(files):
+    response = files.get("/file")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["accept-ranges"] == "bytes"
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),        # a-b
+    ("bytes=1000-", 1000, 1023),  # a-
+    ("bytes=-24", 1000, 1023),    # 后缀 -n
+    ("bytes=1000-5000", 1000, 1023),  # 结束位置超出文件时截断
+    ("bytes=-5000", 0, 1023),     # 后缀长度超过文件
+])
+def test_range(files, header, start, end):
+    response = files.get("/file", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+    assert response.content == CONTENT[start:end + 1]
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=-0", "bytes=500-100"])
+def test_unsatisfiable_range_returns_416(files, header):
+    response = files.get("/file", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+def test_unsupported_range_returns_full_file(files):
+    response = files.get("/file", headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+def test_if_range_match_and_mismatch(files):
+    etag = files.get("/file").headers["etag"]
+    matched = files.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matched.status_code == 206
+    assert matched.content == CONTENT[:10]
+    # 版本不符时忽略 Range，返回完整文件
+    mismatched = files.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert mismatched.status_code == 200
+    assert mismatched.content == CONTENT
+
+def test_if_none_match_returns_304(files):
+    first = files.get("/file")
+    response = files.get("/file", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == first.headers["etag"]
+    assert files.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_if_modified_since_returns_304(files):
+    last_modified = files.get("/file").headers["last-modified"]
+    assert files.get("/file", headers={"If-Modified-Since": last_modified}).status_code == 304
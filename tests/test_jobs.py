@@ -0,0 +1,97 @@
+import datetime
+import time
+import pytest
+import config
+import database
+import jobs
+from llm_client import LLMError
+from models import AIJob
+
+calls = []
+
+@jobs.handler("test_flaky")
+async def flaky(db, payload):
+    calls.append(payload)
+    if len(calls) == 1:
+        raise LLMError("HTTP 503", transient=True)
+    return {"ok": True}
+
+@jobs.handler("test_broken")
+async def broken(db, payload):
+    raise ValueError("AI返回的不是任务数组")
+
+@jobs.handler("test_echo")
+async def echo(db, payload):
+    return payload
+
+@pytest.fixture
+def paused(client):
+    # 停掉后台worker并清空队列，由测试自己领取和执行
+    client.portal.call(jobs.stop)
+    with database.SessionLocal() as db:
+        db.query(AIJob).delete()
+        db.commit()
+    calls.clear()
+    yield client
+
+    async def restart():
+        jobs.start()
+    client.portal.call(restart)
+
+def _enqueue(kind, payload=None):
+    with database.SessionLocal() as db:
+        return jobs._enqueue(db, kind, payload or {}, 3).id
+
+def _claim():
+    with database.SessionLocal() as db:
+        return jobs._claim(db)
+
+def _get(job_id):
+    with database.SessionLocal() as db:
+        return jobs._get(db, job_id)
+
+def test_claim_takes_each_job_once(paused):
+    first, second = _enqueue("test_echo"), _enqueue("test_echo")
+    assert _claim().id == first
+    assert _claim().id == second
+    assert _claim() is None
+    assert _get(first).status == jobs.RUNNING and _get(first).attempts == 1
+
+def test_expired_lease_is_reclaimed(paused):
+    job_id = _enqueue("test_echo")
+    _claim()
+    assert _claim() is None
+    with database.SessionLocal() as db:
+        db.query(AIJob).filter(AIJob.id == job_id).update(
+            {AIJob.locked_until: datetime.datetime.utcnow() - datetime.timedelta(seconds=1)})
+        db.commit()
+    job = _claim()
+    assert job.id == job_id and job.attempts == 2
+
+def test_transient_error_retries_without_cache(paused, monkeypatch):
+    monkeypatch.setattr(config, "AI_JOB_RETRY_BACKOFF", 0)
+    job_id = _enqueue("test_flaky", {"no_cache": False})
+    paused.portal.call(jobs._run, _claim())
+    job = _get(job_id)
+    assert job.status == jobs.QUEUED and "503" in job.error
+    paused.portal.call(jobs._run, _claim())
+    assert _get(job_id).status == jobs.SUCCEEDED
+    assert [c["no_cache"] for c in calls] == [False, True]
+
+def test_permanent_error_fails_immediately(paused):
+    job_id = _enqueue("test_broken")
+    paused.portal.call(jobs._run, _claim())
+    job = _get(job_id)
+    assert job.status == jobs.FAILED and job.attempts == 1 and "ValueError" in job.error
+
+def test_poll_job_until_done(client):
+    job = client.portal.call(jobs.enqueue, "test_echo", {"value": 1})
+    deadline = time.monotonic() + 5
+    while True:
+        body = client.get(f"/jobs/{job.id}").json()
+        if body["status"] in (jobs.SUCCEEDED, jobs.FAILED) or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert body["status"] == jobs.SUCCEEDED
+    assert body["result"] == {"value": 1}
+    assert client.get("/jobs/999999").status_code == 404
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+import pytest
+import llm_cache
+from llm_cache import LLMCache, SQLiteTier
+
+def test_invalid_output_not_cached():
+    cache = LLMCache()
+    outputs = iter(["不是JSON", "[1, 2]"])
+
+    async def compute():
+        return next(outputs)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await cache.get_or_compute("k", compute, validate=json.loads)
+        assert await cache.get("k") is None
+        # 下一次请求重新调用而不是拿到缓存的坏结果
+        assert await cache.get_or_compute("k", compute, validate=json.loads) == "[1, 2]"
+        assert await cache.get("k") == "[1, 2]"
+
+    asyncio.run(run())
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    cache = LLMCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "结果"
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()   # 发起请求的客户端断开
+        assert await waiter == "结果"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert calls == [1] and cache.stats["coalesced"] == 1
+        assert await cache.get("k") == "结果"
+
+    asyncio.run(run())
+
+def test_invalid_cached_entry_evicted(tmp_path):
+    cache = LLMCache(sqlite_path=str(tmp_path / "cache.db"))
+
+    async def compute():
+        return "[]"
+
+    async def run():
+        await cache.set("k", "坏结果")
+        assert await cache.get_or_compute("k", compute, validate=json.loads) == "[]"
+        assert cache.stats["invalid"] == 1
+        assert cache.disk.get("k")[0] == "[]"
+
+    asyncio.run(run())
+
+def test_sqlite_tier_purges_expired_rows(tmp_path, monkeypatch):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), ttl=10)
+    tier.set("read", "v")
+    tier.set("stale", "v")
+    now = time.time() + llm_cache.PURGE_INTERVAL + 1
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now)
+    # 读到过期行时删除
+    assert tier.get("read") is None
+    assert tier._conn.execute("SELECT COUNT(*) FROM llm_cache WHERE key = 'read'").fetchone()[0] == 0
+    # 写入时定期清理没人再读的过期行
+    tier.set("fresh", "v")
+    assert [key for key, in tier._conn.execute("SELECT key FROM llm_cache")] == ["fresh"]
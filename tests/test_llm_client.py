@@ -0,0 +1,49 @@
+import asyncio
+import time
+import httpx
+import pytest
+from llm_client import LLMClient, LLMError
+
+def _reply(content="ok"):
+    return {"choices": [{"message": {"content": content}}]}
+
+def test_missing_api_key_raises_clear_error():
+    client = LLMClient(api_key="", transport=httpx.MockTransport(lambda request: httpx.Response(200, json=_reply())))
+    with pytest.raises(LLMError, match="DEEPSEEK_API_KEY"):
+        asyncio.run(client.chat("system", "user"))
+
+def test_retry_after_capped_at_timeout():
+    client = LLMClient(api_key="k", timeout=0.2)
+    response = httpx.Response(429, headers={"Retry-After": "3600"})
+    assert client._backoff(0, response) == 0.2
+
+def test_backoff_does_not_hold_concurrency_slot():
+    # 并发上限为1：第一个请求收到429退避期间，第二个请求应能立即执行
+    calls = []
+
+    def handler(request):
+        calls.append(request.content)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        return httpx.Response(200, json=_reply())
+
+    client = LLMClient(api_key="k", max_concurrency=1, max_retries=1, transport=httpx.MockTransport(handler))
+
+    async def run():
+        first = asyncio.create_task(client.chat("system", "first"))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        assert await client.chat("system", "second") == "ok"
+        elapsed = time.perf_counter() - start
+        assert await first == "ok"
+        await client.aclose()
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
+
+@pytest.mark.parametrize("status, transient", [(503, True), (400, False)])
+def test_http_error_marks_transient(status, transient):
+    client = LLMClient(api_key="k", max_retries=0, transport=httpx.MockTransport(lambda request: httpx.Response(status)))
+    with pytest.raises(LLMError) as exc:
+        asyncio.run(client.chat("system", "user"))
+    assert exc.value.transient is transient
@@ -0,0 +1,38 @@
+
+ROUTE = "/tasks/{task_id}"
+
+def _scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def _sample(samples, name, **labels):
+    key = name + "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+    return samples.get(key, 0)
+
+def test_request_metrics_use_route_template(client):
+    task_id = client.post("/tasks/", json={"title": "指标"}).json()["id"]
+    before = _scrape(client)
+    for _ in range(2):
+        assert client.get(f"/tasks/{task_id}").status_code == 200
+    after = _scrape(client)
+
+    requests = dict(method="GET", route=ROUTE, status="200")
+    assert _sample(after, "http_requests_total", **requests) == _sample(before, "http_requests_total", **requests) + 2
+    latency = dict(method="GET", route=ROUTE)
+    assert _sample(after, "http_request_duration_seconds_count", **latency) \
+        == _sample(before, "http_request_duration_seconds_count", **latency) + 2
+    buckets = [value for name, value in after.items()
+               if name.startswith("http_request_duration_seconds_bucket{") and f'route="{ROUTE}"' in name]
+    assert buckets == sorted(buckets) and buckets[-1] == _sample(after, "http_request_duration_seconds_count", **latency)
+    # SQL 事件钩子按请求计数：读取任务至少执行一条语句
+    assert _sample(after, "http_request_sql_statements_sum", route=ROUTE) \
+        >= _sample(before, "http_request_sql_statements_sum", route=ROUTE) + 2
+    assert any(name.startswith("db_statement_duration_seconds_count") for name in after)
+    # 标签是路由模板，不是带id的原始路径
+    assert not any(f'route="/tasks/{task_id}"' in name for name in after)
@@ -0,0 +1,35 @@
+import threading
+import config
+import database
+import semantic
+
+def test_falls_back_to_fulltext_until_index_ready(client, monkeypatch):
+    monkeypatch.setattr(semantic, "_ready", threading.Event())
+    monkeypatch.setattr(semantic, "start", lambda: None)
+    task_id = client.post("/tasks/", json={"title": "季度预算评审"}).json()["id"]
+    assert semantic.search("预算评审") is None
+    hits = client.get("/search/semantic", params={"q": "预算评审"}).json()
+    assert task_id in [h["task"]["id"] for h in hits]
+
+def test_background_build_then_search(client, monkeypatch):
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 0)
+    monkeypatch.setattr(semantic, "_ready", threading.Event())
+    monkeypatch.setattr(semantic, "_build_thread", None)
+    task_id = client.post("/tasks/", json={"title": "机房迁移方案"}).json()["id"]
+    semantic._build()
+    assert semantic.is_ready()
+    assert task_id in [task for task, _ in semantic.search("机房迁移方案")]
+    hits = client.get("/search/semantic", params={"q": "机房迁移方案"}).json()
+    assert hits[0]["task"]["id"] == task_id
+
+def test_sync_holds_watermark_before_unsettled_changes(client, monkeypatch):
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 0)
+    index = semantic.get_index()
+    with database.SessionLocal() as db:
+        semantic.sync(db, index)
+    settled = index.seq
+    monkeypatch.setattr(config, "CHANGES_SAFE_SECONDS", 60)
+    client.post("/tasks/", json={"title": "尚未稳定的变更"})
+    with database.SessionLocal() as db:
+        semantic.sync(db, index)
+    assert index.seq == settled
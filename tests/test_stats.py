@@ -0,0 +1,39 @@
+import crud
+import database
+import tags as task_tags
+from schemas import TaskCreate
+
+def test_stats_reflect_created_task(client):
+    before = client.get("/tasks/stats").json()  # 读一次，结果进入缓存
+    response = client.post("/tasks/", json={"title": "统计缓存", "priority": "high", "tags": "stats-cache"})
+    assert response.status_code == 200
+    after = client.get("/tasks/stats").json()
+    assert after["total"] == before["total"] + 1
+    assert after["by_priority"].get("high", 0) == before["by_priority"].get("high", 0) + 1
+    assert after["by_tag"].get("stats-cache") == 1
+
+def test_stats_reflect_bulk_update_and_delete(client):
+    ids = client.post("/tasks/bulk", json=[{"title": f"统计缓存 {i}"} for i in range(3)]).json()["ids"]
+    stats = client.get("/tasks/stats").json()
+    client.put(f"/tasks/{ids[0]}", json={"status": "completed"})
+    after = client.get("/tasks/stats").json()
+    assert after["by_status"].get("completed", 0) == stats["by_status"].get("completed", 0) + 1
+    client.delete(f"/tasks/{ids[1]}")
+    assert client.get("/tasks/stats").json()["total"] == stats["total"] - 1
+
+def test_stats_computed_across_invalidation_not_cached(client, monkeypatch):
+    # 查询期间有写入（失效）时，查到的旧结果不能进缓存
+    before = client.get("/tasks/stats").json()
+    facet_counts = task_tags.facet_counts
+
+    def write_during_query(db, limit=None):
+        counts = facet_counts(db, limit=limit)
+        with database.SessionLocal() as other:
+            crud.create_task(other, TaskCreate(title="统计并发写入"))
+        return counts
+
+    crud.invalidate_stats()
+    monkeypatch.setattr(task_tags, "facet_counts", write_during_query)
+    assert client.get("/tasks/stats").json()["total"] == before["total"]
+    monkeypatch.setattr(task_tags, "facet_counts", facet_counts)
+    assert client.get("/tasks/stats").json()["total"] == before["total"] + 1
@@ -0,0 +1,31 @@
+import pytest
+from models import Attachment
+import database
+
+TAG = "sql-count"
+
+@pytest.fixture(scope="module")
+def tagged_tasks(client):
+    # 每个任务带两个附件，全量视图需要批量加载附件
+    ids = client.post("/tasks/bulk", json=[{"title": f"统计SQL {i}", "tags": TAG} for i in range(12)]).json()["ids"]
+    with database.SessionLocal() as db:
+        for task_id in ids:
+            for n in range(2):
+                db.add(Attachment(task_id=task_id, filename=f"{n}.txt", filepath=f"/nonexistent/{task_id}-{n}.txt", size=1))
+        db.commit()
+    return ids
+
+@pytest.mark.parametrize("view, expected", [("full", 2), ("summary", 1)])
+@pytest.mark.parametrize("paging", [{}, {"sort": "created_at"}, {"sort": "priority"}])
+def test_list_statement_count_independent_of_page_size(client, tagged_tasks, count_queries, view, expected, paging):
+    # full：任务一条 + 附件一条 IN 查询；summary：只查任务。与每页条数无关（无 N+1）
+    for limit in (1, 5, 12):
+        with count_queries() as statements:
+            response = client.get("/tasks/", params={"tag": TAG, "view": view, "limit": limit, **paging})
+        assert response.status_code == 200
+        body = response.json()
+        items = body["items"] if isinstance(body, dict) else body
+        assert len(items) == limit
+        if view == "full":
+            assert all(len(item["attachments"]) == 2 for item in items)
+        assert len(statements) == expected, statements
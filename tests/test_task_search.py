@@ -0,0 +1,8 @@
+import pytest
+
+@pytest.mark.parametrize("q, expected", [("he_%", ["he_%通配"]), ("50%", ["进度50%"]), ("a\\b", ["路径a\\b"])])
+def test_keyword_wildcards_match_literally(client, q, expected):
+    for title in ("hello通配", "he_%通配", "进度50%", "进度500", "路径a\\b", "路径ab"):
+        client.post("/tasks/", json={"title": title, "tags": "like-escape"})
+    body = client.get("/tasks/search", params={"q": q, "tag": "like-escape", "view": "summary"}).json()
+    assert sorted({item["title"] for item in body["items"]}) == expected
@@ -0,0 +1,54 @@
+import asyncio
+import re
+import pytest
+import upload_limit
+from upload_limit import UploadLimitMiddleware
+
+LIMIT = 4096
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setattr(upload_limit, "UPLOAD_ROUTES", ((re.compile(r"^/tasks/\d+/attachments/?$"), LIMIT),))
+
+@pytest.fixture
+def task_id(client):
+    return client.post("/tasks/", json={"title": "上传大小"}).json()["id"]
+
+def test_rejects_on_content_length_without_reading_body(small_limit):
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append("app")
+
+    async def receive():
+        calls.append("receive")
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/tasks/1/attachments/",
+             "headers": [(b"content-length", str(LIMIT + 1).encode())]}
+    asyncio.run(UploadLimitMiddleware(app)(scope, receive, send))
+    assert calls == []
+    assert sent[0]["status"] == 413
+
+def test_oversized_upload_returns_413(client, small_limit, task_id):
+    response = client.post(f"/tasks/{task_id}/attachments/", files={"file": ("big.bin", b"x" * (LIMIT * 2))})
+    assert response.status_code == 413
+
+def test_oversized_chunked_upload_returns_413(client, small_limit, task_id):
+    # 没有 Content-Length 的分块上传，边读边计数
+    def chunks():
+        for _ in range(8):
+            yield b"x" * 1024
+
+    response = client.post(f"/tasks/{task_id}/attachments/", content=chunks(),
+                           headers={"content-type": "multipart/form-data; boundary=abc"})
+    assert response.status_code == 413
+
+def test_upload_within_limit_succeeds(client, small_limit, task_id):
+    response = client.post(f"/tasks/{task_id}/attachments/", files={"file": ("small.txt", b"hello")})
+    assert response.status_code == 200
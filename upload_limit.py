@@ -0,0 +1,85 @@
+import json
+import re
+from starlette.exceptions import HTTPException
+import config
+
+# 上传请求体大小限制：在 Starlette 解析表单（把整个请求体落到临时文件）之前生效。
+# 带 Content-Length 且超限的请求不读请求体直接返回413；分块传输等没有长度的请求边读边计数，超限即中止。
+
+MULTIPART_OVERHEAD = 64 * 1024  # multipart 边界和各段头部的余量
+
+# (路径模式, 请求体上限)：单个上传为单文件上限加余量，批量上传另有总量上限
+UPLOAD_ROUTES = (
+    (re.compile(r"^/tasks/\d+/attachments/?$"), config.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD),
+    (re.compile(r"^/tasks/\d+/attachments/batch/?$"), config.MAX_UPLOAD_REQUEST_BYTES + MULTIPART_OVERHEAD),
+)
+
+class BodyTooLarge(HTTPException):
+    # 继承 HTTPException：在路由解析表单时抛出会直接变成413响应，而不是被当作表单解析失败返回400
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"请求体超过大小上限 {limit} 字节")
+
+def body_limit(scope):
+    if scope["type"] != "http" or scope["method"] != "POST":
+        return None
+    for pattern, limit in UPLOAD_ROUTES:
+        if pattern.match(scope["path"]):
+            return limit
+    return None
+
+def _content_length(scope):
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+async def _reject(send, error: BodyTooLarge):
+    body = json.dumps({"detail": error.detail}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close")],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class UploadLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = body_limit(scope)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        length = _content_length(scope)
+        if length is not None and length > limit:
+            await _reject(send, BodyTooLarge(limit))
+            return
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge as e:
+            if started:
+                raise
+            await _reject(send, e)